@@ -1,5 +1,5 @@
 #!/bin/bash
 sudo apt update
 sudo apt install cmake python3-dev python3-pip python3-tk libboost-python-dev libboost-serialization-dev libboost-test-dev libarmadillo-dev
-sudo pip3 install pygame matplotlib
+sudo pip3 install numpy pygame matplotlib
 echo -e DONE!
@@ -1,2 +1,2 @@
 #!/bin/bash
-python3 self_organizing_network/EAWindow.py
+python3 -m self_organizing_network.ea_window
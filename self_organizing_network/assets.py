@@ -0,0 +1,51 @@
+import os
+from collections import OrderedDict
+
+import pygame
+import self_organizing_network.utils as u
+
+
+ASSETS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_images = {}
+_rotations = OrderedDict()
+
+
+def load_image(name, scale=1):
+    """image loaded from disk and scaled once per process"""
+    key = (name, scale)
+    image = _images.get(key)
+    if image is None:
+        image = _scale_image(pygame.image.load(os.path.join(ASSETS_DIR, name)), scale)
+        _images[key] = image
+    return image
+
+
+def rotated_image(name, scale, angle):
+    """rotated copy of an image, cached for the most recently used whole-degree angles"""
+    key = (name, scale, int(angle) % 360)
+    image = _rotations.get(key)
+    if image is not None:
+        _rotations.move_to_end(key)
+        return image
+
+    image = _rotate_image(load_image(name, scale), key[2])
+    _rotations[key] = image
+    if len(_rotations) > u.ROTATION_ATLAS_SIZE:
+        _rotations.popitem(last=False)
+    return image
+
+
+def _rotate_image(image, angle):
+    """rotate an image while keeping its center and size"""
+    orig_rect = image.get_rect()
+    rot_image = pygame.transform.rotate(image, angle)
+    rot_rect = orig_rect.copy()
+    rot_rect.center = rot_image.get_rect().center
+    return rot_image.subsurface(rot_rect).copy()
+
+
+def _scale_image(image, scale):
+    scaled_width = int(image.get_width() * scale)
+    scaled_height = int(image.get_height() * scale)
+    return pygame.transform.scale(image, (scaled_width, scaled_height))
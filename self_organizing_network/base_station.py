@@ -4,75 +4,42 @@ import self_organizing_network.utils as u
 from self_organizing_network.object import Object
 
 class BaseStation(Object):
-    def __init__(self, coordinates, power):
-        image = pygame.image.load('base_station.png')
-        super().__init__(image=image,
-                         coordinates=coordinates,
+    def __init__(self, simulation, index):
+        super().__init__(image_name='base_station.png',
                          image_scale=1)
 
-        self._off = False
-        self._power = power
-        self._mobile_stations = []
-        self._neighbours = []
+        self._simulation = simulation
+        self._index = index
+        self._range_radius = 0
+        self._range_rect = None
 
+    @property
+    def coordinates(self):
+        return self._simulation.bs_coordinates[self._index]
 
     def update(self, surface):
         self.direction += 1
-        self._draw_range(surface)
-        super(BaseStation, self).update(surface)
+        return super(BaseStation, self).update(surface)
 
-    def _draw_range(self, surface):
-        radius = int(math.sqrt(self._power / (4 * math.pi * u.POWER_DENSITY_THRESHOLD)))
-        self._draw_circle(surface, u.COLOR_RED, radius, 1)
+    def refresh_range(self):
+        """areas to repaint if the coverage circle changed since it was last drawn"""
+        radius = int(math.sqrt(self._simulation.get_power(self._index) / (4 * math.pi * u.POWER_DENSITY_THRESHOLD)))
+        if radius == self._range_radius:
+            return []
+
+        x = int(self.coordinates[0])
+        y = int(self.coordinates[1])
+        rect = pygame.Rect(x - radius, y - radius, 2 * radius + 1, 2 * radius + 1)
+        changed = [rect] if self._range_rect is None else [self._range_rect, rect]
+        self._range_radius = radius
+        self._range_rect = rect
+        return changed
+
+    def draw_range(self, surface):
+        self._draw_circle(surface, u.COLOR_RED, self._range_radius, 1)
 
     def _draw_circle(self, surface, color, radius, thickness):
         x = int(self.coordinates[0])
         y = int(self.coordinates[1])
         if radius >= thickness:
             pygame.draw.circle(surface, color, (x, y), radius, thickness)
-
-    def calculate_power_density(self, coordinates):
-        d_x = self.coordinates[0] - coordinates[0]
-        d_y = self.coordinates[1] - coordinates[1]
-        distance_square = d_x**2 + d_y**2
-
-        if distance_square != 0:
-            return self._power / (4 * math.pi * distance_square)
-        else:
-            return self._power
-
-    def connect(self, mobile_station):
-        self._mobile_stations.append(mobile_station)
-
-    def disconnect(self, mobile_station):
-        self._mobile_stations.remove(mobile_station)
-
-    def get_mobile_stations(self):
-        return self._mobile_stations
-
-    def change_power_by(self, power_change):
-        if not self._off:
-            self._power += power_change
-        if self._power < 1:
-            self._power = 1
-        if self._power > u.MAX_BASE_STATION_POWER:
-            self._power = u.MAX_BASE_STATION_POWER
-
-    def get_power(self):
-        return self._power
-
-    def is_on(self):
-        return self._power > 1
-
-    def turn_off(self):
-        self._off = True
-        self._power = 1
-
-    def add_neighbour(self, base_station):
-        self._neighbours.append(base_station)
-
-    def get_neighbours(self):
-        return self._neighbours
-
-    def has_free_channels(self):
-        return len(self._mobile_stations) < u.MAX_BS_CAPACITY
\ No newline at end of file
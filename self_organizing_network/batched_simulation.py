@@ -0,0 +1,181 @@
+import numpy as np
+import self_organizing_network.network_agent as network_agent
+import self_organizing_network.numpy_evolution as numpy_evolution
+import self_organizing_network.utils as u
+from self_organizing_network.simulation_engine import FOUR_PI, SimulationEngine, move
+
+
+class BatchedSimulation:
+    """K independent episodes advanced in lock-step; every array of SimulationEngine gains a leading
+    episode dimension and an episode leaves the batch as soon as it ends"""
+
+    def __init__(self, networks, seeds, input_size, rows=u.DEFAULT_ROWS, cols=u.DEFAULT_COLS,
+                 ms_count=u.DEFAULT_MS, synchronous=u.SYNCHRONOUS_CONTROL, size=u.WINDOW_SIZE,
+                 racing_bound=None):
+        self.networks = list(networks)
+        self.racing_bound = racing_bound
+        self.input_size = input_size
+        self.synchronous = synchronous
+        self.size = size
+        self.ms_count = ms_count
+        self.running = False
+
+        # initial states and random streams are those of a fresh engine with the same seed
+        engines = [SimulationEngine(rows=rows, cols=cols, ms_count=ms_count, size=size, seed=seed)
+                   for seed in seeds]
+        for engine in engines:
+            engine.reset()
+        self.bs_coordinates = engines[0].bs_coordinates
+        self.bs_neighbours = engines[0].bs_neighbours
+        self.bs_power = np.stack([engine.bs_power for engine in engines])
+        self.bs_off = np.stack([engine.bs_off for engine in engines])
+        self.bs_load = np.stack([engine.bs_load for engine in engines])
+        self.ms_coordinates = np.stack([engine.ms_coordinates for engine in engines])
+        self.ms_velocity = np.stack([engine.ms_velocity for engine in engines])
+        self.ms_base_station = np.stack([engine.ms_base_station for engine in engines])
+        self._action_randoms = [engine._action_random for engine in engines]
+
+        self.time_elapsed = 0
+        self.score = np.zeros(len(engines))
+        self.times_disconnected = np.zeros(len(engines), dtype=np.int64)
+        # row of the batch -> index of the episode
+        self.episodes = np.arange(len(engines))
+
+        self.scores = np.full(len(engines), np.nan)
+        self.ticks = np.zeros(len(engines), dtype=np.int64)
+        self.truncated = np.zeros(len(engines), dtype=bool)
+
+    def run(self):
+        self.running = True
+        while self.running and len(self.episodes):
+            self.step()
+        return self.scores
+
+    def step(self):
+        self.time_elapsed += 1
+        self._refresh_score()
+        if not len(self.episodes):
+            return
+        self._refresh_connections()
+        self.ms_coordinates = move(self.ms_coordinates, self.ms_velocity, self.size)
+        self._tick()
+
+        self._finish((self.time_elapsed == u.DEFAULT_DURATION)
+                     | (self.times_disconnected > u.DISCONNECTED_TOLERANCE))
+
+    def _refresh_score(self):
+        if self.ms_count == 0:
+            return
+        saturated = np.any((self.bs_power == u.MAX_BASE_STATION_POWER) | (self.bs_power == 1), axis=1)
+        self._finish(saturated)
+
+        modifier = self.bs_power.mean(axis=1)
+        connected = np.count_nonzero(self.ms_base_station != u.NO_BASE_STATION, axis=1)
+        self.score += (2 * connected - self.ms_count) / modifier
+
+        if self.racing_bound is not None and self.time_elapsed % u.RACING_INTERVAL == 0:
+            # the same heuristic best case as SimulationEngine._race
+            best_case = self.score + (u.DEFAULT_DURATION - self.time_elapsed) * self.ms_count / modifier
+            hopeless = best_case < self.racing_bound
+            self.truncated[self.episodes[hopeless]] = True
+            self._finish(hopeless)
+
+    def _refresh_connections(self):
+        d_x = self.bs_coordinates[:, 0] - self.ms_coordinates[:, :, 0, np.newaxis]
+        d_y = self.bs_coordinates[:, 1] - self.ms_coordinates[:, :, 1, np.newaxis]
+        distance_square = d_x ** 2 + d_y ** 2
+        power = np.broadcast_to(self.bs_power[:, np.newaxis, :], distance_square.shape)
+        density = power.copy()
+        np.divide(power, FOUR_PI * distance_square, out=density, where=distance_square != 0)
+
+        best = np.argmax(density, axis=2)
+        in_range = np.take_along_axis(density, best[:, :, np.newaxis], axis=2)[:, :, 0] > u.POWER_DENSITY_THRESHOLD
+        best = np.where(in_range, best, u.NO_BASE_STATION)
+
+        changed = best != self.ms_base_station
+        self.times_disconnected += np.count_nonzero(changed & (best == u.NO_BASE_STATION), axis=1)
+
+        stations = self.bs_power.shape[1]
+        rows = np.arange(len(self.episodes))[:, np.newaxis]
+        joining = changed & (best != u.NO_BASE_STATION)
+        joins = np.bincount((rows * stations + best)[joining], minlength=self.bs_power.size).reshape(-1, stations)
+        # as in SimulationEngine, arrival order only matters where a station could fill up
+        ordered = np.any(self.bs_load + joins - 1 >= u.MAX_BS_CAPACITY, axis=1)
+
+        fast = changed & ~ordered[:, np.newaxis]
+        leaving = fast & (self.ms_base_station != u.NO_BASE_STATION)
+        self.bs_load -= np.bincount((rows * stations + self.ms_base_station)[leaving],
+                                    minlength=self.bs_power.size).reshape(-1, stations)
+        self.bs_load += joins * ~ordered[:, np.newaxis]
+        self.ms_base_station[fast] = best[fast]
+
+        for row in np.flatnonzero(ordered).tolist():
+            self._admit_in_order(row, np.flatnonzero(changed[row]), best[row])
+
+    def _admit_in_order(self, row, changed, best):
+        load = self.bs_load[row]
+        assignment = self.ms_base_station[row]
+        for ms in changed.tolist():
+            if assignment[ms] != u.NO_BASE_STATION:
+                load[assignment[ms]] -= 1
+                assignment[ms] = u.NO_BASE_STATION
+            bs = best[ms]
+            if bs != u.NO_BASE_STATION and load[bs] < u.MAX_BS_CAPACITY:
+                assignment[ms] = bs
+                load[bs] += 1
+
+    def _tick(self):
+        if self.synchronous:
+            stations = np.broadcast_to(np.arange(self.bs_power.shape[1]), self.bs_power.shape)
+        else:
+            stations = np.array([[self._action_randoms[episode].randrange(0, self.bs_power.shape[1])]
+                                 for episode in self.episodes.tolist()])
+
+        inputs = network_agent.observe(self.bs_power, self.bs_load, self.bs_neighbours, stations,
+                                       np.zeros(stations.shape + (self.input_size,)))
+        networks = [self.networks[episode] for episode in self.episodes.tolist()]
+        if all(isinstance(network, numpy_evolution.NeuralNetwork) for network in networks):
+            # one forward pass for the whole batch instead of one per network
+            row_networks = [network for network in networks for _ in range(stations.shape[1])]
+            outputs = np.round(numpy_evolution.feed_forward_rows(row_networks, inputs.reshape(-1, self.input_size)), 3)
+            power_change = network_agent.to_power_changes(outputs).reshape(stations.shape)
+        else:
+            power_change = np.zeros(stations.shape)
+            for network, rows in self._network_rows():
+                power_change[rows] = self._power_changes(network, inputs[rows])
+
+        power = np.take_along_axis(self.bs_power, stations, axis=1)
+        power = np.where(np.take_along_axis(self.bs_off, stations, axis=1), power, power + power_change)
+        np.put_along_axis(self.bs_power, stations, np.clip(power, 1, u.MAX_BASE_STATION_POWER), axis=1)
+
+    def _network_rows(self):
+        rows = {}
+        for row, episode in enumerate(self.episodes.tolist()):
+            rows.setdefault(id(self.networks[episode]), (self.networks[episode], []))[1].append(row)
+        return rows.values()
+
+    def _power_changes(self, network, inputs):
+        """power changes of (episodes, stations, inputs) observations handled by one network"""
+        if self.synchronous or hasattr(network, 'feed_forward_all'):
+            outputs = network_agent.predict_all(network, inputs.reshape(-1, self.input_size))
+            return network_agent.to_power_changes(outputs).reshape(inputs.shape[:2])
+        return np.array([[network_agent.to_power_change(network_agent.predict(network, vector))]
+                         for vector in inputs[:, 0].tolist()])
+
+    def _finish(self, finished):
+        if not np.any(finished):
+            return
+        episodes = self.episodes[finished]
+        self.scores[episodes] = self.score[finished]
+        self.ticks[episodes] = self.time_elapsed
+
+        keep = ~finished
+        self.episodes = self.episodes[keep]
+        self.score = self.score[keep]
+        self.times_disconnected = self.times_disconnected[keep]
+        self.bs_power = self.bs_power[keep]
+        self.bs_off = self.bs_off[keep]
+        self.bs_load = self.bs_load[keep]
+        self.ms_coordinates = self.ms_coordinates[keep]
+        self.ms_velocity = self.ms_velocity[keep]
+        self.ms_base_station = self.ms_base_station[keep]
@@ -0,0 +1,257 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import self_organizing_network.utils as u
+from self_organizing_network.ea_controller import EAController
+from self_organizing_network.network_agent import NetworkAgent, ObservationBuilder
+from self_organizing_network.profiler import TickProfiler
+from self_organizing_network.simulation_engine import SimulationEngine
+
+
+PHASES = ['time', 'score', 'connections', 'move', 'tick']  # render needs a display
+
+# name, rows, cols, mobile stations, map size, synchronous control, timed ticks
+SCENARIOS = [('default', u.DEFAULT_ROWS, u.DEFAULT_COLS, u.DEFAULT_MS, u.WINDOW_SIZE, False, 2000),
+             ('default_synchronous', u.DEFAULT_ROWS, u.DEFAULT_COLS, u.DEFAULT_MS, u.WINDOW_SIZE, True, 2000),
+             ('grid_10x10', 10, 10, 1000, 2000, False, 500),
+             ('grid_30x30', 30, 30, 10000, 6000, False, 100),
+             ('grid_30x30_synchronous', 30, 30, 10000, 6000, True, 100),
+             ('grid_60x60', 60, 60, 50000, 12000, False, 30)]
+
+SEED = 1
+
+
+class FixedNetwork:
+    """deterministic single-layer network standing in for an evolved one, so that runs are comparable"""
+
+    def __init__(self, input_size, output_size):
+        rng = np.random.default_rng(SEED)
+        self._weights = rng.normal(0, 1 / np.sqrt(input_size), (input_size, output_size))
+        self._output = [0.0] * output_size
+
+    def feed_forward(self, input_vector):
+        self._output = np.tanh(np.dot(input_vector, self._weights)).tolist()
+
+    def get_output(self):
+        return list(self._output)
+
+    def feed_forward_all(self, input_matrix):
+        return np.tanh(input_matrix @ self._weights)
+
+
+class _Restart:
+    def on_finish(self):
+        pass
+
+
+def _engine(rows, cols, ms_count, size, synchronous):
+    agent = NetworkAgent(FixedNetwork(EAController.INPUT_SIZE, EAController.OUTPUT_SIZE), EAController.INPUT_SIZE)
+    simulation = SimulationEngine(finish_listener=_Restart(), tick_listener=agent, rows=rows, cols=cols,
+                                  ms_count=ms_count, synchronous=synchronous, size=size, seed=SEED)
+    simulation.reset()
+    return simulation
+
+
+def run_scenario(name, rows, cols, ms_count, size, synchronous, ticks):
+    simulation = _engine(rows, cols, ms_count, size, synchronous)
+    simulation.step()  # warm-up
+
+    start = time.perf_counter()
+    for _ in range(ticks):
+        simulation.step()
+    elapsed = time.perf_counter() - start
+
+    simulation = _engine(rows, cols, ms_count, size, synchronous)
+    simulation.profiler = TickProfiler(window=ticks)
+    for _ in range(ticks):
+        simulation.step()
+    phases = simulation.profiler.summary()['phases']
+
+    tracemalloc.start()
+    simulation = _engine(rows, cols, ms_count, size, synchronous)
+    for _ in range(min(ticks, 10)):
+        simulation.step()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'name': name,
+            'rows': rows,
+            'cols': cols,
+            'base_stations': len(simulation.bs_power),
+            'mobile_stations': ms_count,
+            'synchronous': synchronous,
+            'ticks': ticks,
+            'ticks_per_second': ticks / elapsed,
+            'phase_latency_us': {phase: phases[phase]['mean_us'] for phase in PHASES},
+            'peak_memory_bytes': peak_memory}
+
+
+def run_observation(repeats=5000):
+    """network inputs of one base station, what random control builds every tick, and of all of them"""
+    simulation = _engine(u.DEFAULT_ROWS, u.DEFAULT_COLS, u.DEFAULT_MS, u.WINDOW_SIZE, False)
+    builder = ObservationBuilder(EAController.INPUT_SIZE)
+    stations = len(simulation.bs_power)
+
+    start = time.perf_counter()
+    for i in range(repeats):
+        builder.build(simulation, i % stations)
+    one_station = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        builder.build(simulation)
+    all_stations = time.perf_counter() - start
+
+    return {'name': 'observation',
+            'phase_latency_us': {'one_station': one_station / repeats * 1e6,
+                                 'all_stations': all_stations / repeats * 1e6}}
+
+
+def run_rotation(angles=360):
+    """uncached rotation of a sprite against a lookup in the rotation atlas, if pygame is installed"""
+    try:
+        import self_organizing_network.assets as assets
+    except ImportError:
+        return None
+
+    image = assets.load_image('base_station.png')
+    start = time.perf_counter()
+    for angle in range(angles):
+        assets._rotate_image(image, angle)
+    uncached = time.perf_counter() - start
+
+    for angle in range(angles):
+        assets.rotated_image('base_station.png', 1, angle)
+    start = time.perf_counter()
+    for angle in range(angles):
+        assets.rotated_image('base_station.png', 1, angle)
+    cached = time.perf_counter() - start
+
+    return {'name': 'rotation',
+            'phase_latency_us': {'rotate': uncached / angles * 1e6, 'atlas': cached / angles * 1e6}}
+
+
+# what a training worker or a headless run needs, and the GUI stack none of them may pull in
+CORE_MODULES = ['self_organizing_network.simulation_controller', 'self_organizing_network.ea_controller',
+                'self_organizing_network.evaluation']
+GUI_MODULES = ['tkinter', 'matplotlib', 'pygame']
+
+_IMPORT_PROBE = '''
+import sys, time
+start = time.perf_counter()
+for name in %r:
+    __import__(name)
+print(time.perf_counter() - start)
+print(' '.join(name for name in %r if name in sys.modules))
+'''
+
+
+def run_import(repeats=3):
+    """import time of the core in fresh interpreters (the fastest of a few) and GUI modules it loaded"""
+    times = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', _IMPORT_PROBE % (CORE_MODULES, GUI_MODULES)],
+                                check=True, capture_output=True, text=True).stdout.split('\n')
+        times.append(float(output[0]))
+    return {'name': 'import',
+            'phase_latency_us': {'core': min(times) * 1e6},
+            'gui_modules': output[1].split()}
+
+
+def run(names=None):
+    random.seed(SEED)
+    results = []
+    for scenario in SCENARIOS:
+        if names and scenario[0] not in names:
+            continue
+        result = run_scenario(*scenario)
+        print(_format(result), file=sys.stderr)
+        results.append(result)
+
+    if not names or 'observation' in names:
+        observation = run_observation()
+        print(_format(observation), file=sys.stderr)
+        results.append(observation)
+
+    if not names or 'import' in names:
+        imports = run_import()
+        print(_format(imports), file=sys.stderr)
+        results.append(imports)
+
+    if not names or 'rotation' in names:
+        rotation = run_rotation()
+        if rotation is not None:
+            print(_format(rotation), file=sys.stderr)
+            results.append(rotation)
+
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'timestamp': time.time(),
+            'results': results}
+
+
+def compare(current, baseline, tolerance, noise_us=1.0):
+    """regressions of the current run against a baseline, as human-readable lines"""
+    regressions = []
+    baseline_results = {result['name']: result for result in baseline['results']}
+
+    for result in current['results']:
+        previous = baseline_results.get(result['name'])
+        if previous is None:
+            continue
+        if 'ticks_per_second' in result and \
+                result['ticks_per_second'] < previous['ticks_per_second'] * (1 - tolerance):
+            regressions.append('%s: %.0f ticks/s, was %.0f' % (result['name'], result['ticks_per_second'],
+                                                               previous['ticks_per_second']))
+        if result.get('gui_modules'):
+            regressions.append('%s: core imports %s' % (result['name'], ', '.join(result['gui_modules'])))
+        for phase, latency in result['phase_latency_us'].items():
+            previous_latency = previous['phase_latency_us'].get(phase)
+            if previous_latency is not None and latency > previous_latency * (1 + tolerance) + noise_us:
+                regressions.append('%s/%s: %.1f us, was %.1f us' % (result['name'], phase, latency,
+                                                                    previous_latency))
+    return regressions
+
+
+def _format(result):
+    phases = ' '.join('%s=%.1fus' % item for item in result['phase_latency_us'].items())
+    if 'ticks_per_second' in result:
+        return '%-24s %10.0f ticks/s %8.1f MiB  %s' % (result['name'], result['ticks_per_second'],
+                                                      result['peak_memory_bytes'] / 2 ** 20, phases)
+    if result.get('gui_modules'):
+        phases += ' gui=' + ','.join(result['gui_modules'])
+    return '%-24s %s' % (result['name'], phases)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the simulation, assignment and inference hot paths.')
+    parser.add_argument('--output', default='benchmark.json', help='where to write the results')
+    parser.add_argument('--compare', help='results of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative slowdown')
+    parser.add_argument('--noise', type=float, default=1.0, help='phase slowdown in microseconds always ignored')
+    parser.add_argument('--scenario', action='append', help='run only the named scenarios')
+    args = parser.parse_args()
+
+    results = run(args.scenario)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=1)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance, args.noise)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
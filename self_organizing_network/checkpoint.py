@@ -0,0 +1,148 @@
+import glob
+import gzip
+import io
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+import self_organizing_network.utils as u
+
+
+FILE_PATTERN = 'checkpoint_%08d.pkl.gz'
+
+
+def snapshot(ea_controller, statistics=None):
+    """everything needed to resume, copied so that training can go on while it is written"""
+    return {'backend': ea_controller.get_backend(),
+            'generation': ea_controller.ea.get_current_generation(),
+            'time': time.time(),
+            'ea': _ea_state(ea_controller.ea),
+            'statistics': statistics,
+            # without the cached scores, survivors would be evaluated again on other episodes
+            'fitness_cache': ea_controller.fitness_cache.state() if ea_controller.fitness_cache is not None else None,
+            'random': random.getstate(),
+            'numpy_random': np.random.get_state()}
+
+
+def _ea_state(ea):
+    """the NumPy backend's arrays, compressed by write; a pyvolution population can only be saved
+    to a file, which is done right away"""
+    snapshot = getattr(ea, 'snapshot', None)
+    if snapshot is not None:
+        return snapshot()
+    handle, path = tempfile.mkstemp()
+    os.close(handle)
+    try:
+        ea.save(path)
+        with open(path, 'rb') as file:
+            return file.read()
+    finally:
+        os.remove(path)
+
+
+def write(state, directory, keep=u.CHECKPOINTS_KEPT):
+    if isinstance(state['ea'], dict):
+        # the file EvolutionaryAlgorithm.save would have written, so that resume loads either backend's
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **state['ea'])
+        state = dict(state, ea=buffer.getvalue())
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, FILE_PATTERN % state['generation'])
+    partial = path + '.partial'
+    with gzip.open(partial, 'wb', compresslevel=6) as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(partial, path)
+
+    for old in find(directory)[:-keep]:
+        os.remove(old)
+    return path
+
+
+def find(directory):
+    """checkpoints in a directory, oldest first"""
+    return sorted(glob.glob(os.path.join(directory, FILE_PATTERN.replace('%08d', '*'))))
+
+
+def read(path):
+    if os.path.isdir(path):
+        checkpoints = find(path)
+        if not checkpoints:
+            raise FileNotFoundError('no checkpoints in ' + path)
+        path = checkpoints[-1]
+    with gzip.open(path, 'rb') as file:
+        return pickle.load(file)
+
+
+def resume(path, ea_controller):
+    """restores the algorithm and the random generators from a checkpoint file, or the newest one in a
+    directory; returns the EA parameters and the statistics stored with it"""
+    state = read(path)
+    handle, ea_path = tempfile.mkstemp()
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            file.write(state['ea'])
+        ea_controller.backend = state['backend']
+        _, parameters = ea_controller.load(ea_path)
+    finally:
+        os.remove(ea_path)
+
+    if ea_controller.fitness_cache is not None and state.get('fitness_cache') is not None:
+        ea_controller.fitness_cache.restore(state['fitness_cache'])
+    random.setstate(state['random'])
+    np.random.set_state(state['numpy_random'])
+    return parameters, state['statistics']
+
+
+class Checkpointer:
+    """writes a checkpoint every few generations or minutes from a background thread, keeping the last few"""
+
+    def __init__(self, directory=u.CHECKPOINT_DIR, generations=u.CHECKPOINT_GENERATIONS,
+                 minutes=u.CHECKPOINT_MINUTES, keep=u.CHECKPOINTS_KEPT, statistics=None):
+        self.directory = directory
+        self.generations = generations
+        self.minutes = minutes
+        self.keep = keep
+        self._statistics = statistics
+        self._last_generation = None
+        self._last_time = time.time()
+        self._writer = None
+        self.last_path = None
+
+    def is_due(self, generation):
+        if self._last_generation is None:
+            self._last_generation = generation
+        if self.generations and generation - self._last_generation >= self.generations:
+            return True
+        return bool(self.minutes) and time.time() - self._last_time >= self.minutes * 60
+
+    def on_generation_evaluated(self, ea_controller):
+        generation = ea_controller.ea.get_current_generation()
+        # a write still in progress postpones the next checkpoint instead of blocking training
+        if not self.is_due(generation) or (self._writer is not None and self._writer.is_alive()):
+            return
+
+        statistics = self._statistics() if self._statistics is not None else None
+        state = snapshot(ea_controller, statistics)
+        self._last_generation = generation
+        self._last_time = time.time()
+        self._writer = threading.Thread(target=self._write, args=(state,), daemon=True)
+        self._writer.start()
+
+    def write_now(self, ea_controller):
+        """a checkpoint written before returning, e.g. of the last generation of a run"""
+        self.wait()
+        self._last_generation = ea_controller.ea.get_current_generation()
+        self._last_time = time.time()
+        self._write(snapshot(ea_controller, self._statistics() if self._statistics is not None else None))
+        return self.last_path
+
+    def _write(self, state):
+        self.last_path = write(state, self.directory, self.keep)
+
+    def wait(self):
+        if self._writer is not None:
+            self._writer.join()
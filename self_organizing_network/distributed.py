@@ -0,0 +1,244 @@
+import argparse
+import collections
+import multiprocessing
+import os
+import socket
+import struct
+import threading
+import time
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge, wait
+
+import self_organizing_network.utils as u
+from self_organizing_network.evaluation import BatchedEvaluator, ParallelEvaluator
+
+
+HANDSHAKE_TIMEOUT = 10  # seconds a new connection has to authenticate and introduce itself
+
+# messages, all pickled tuples; connections are authenticated with the authkey before anything is unpickled
+#   worker -> coordinator  ('ready', processes)
+#   coordinator -> worker  ('evaluate', input_size, racing_bound, [(network, seed), ...])
+#   worker -> coordinator  ('scores', scores, truncated, stats)
+#   coordinator -> worker  ('stop',)
+
+
+class Stopped(Exception):
+    """raised by DistributedEvaluator.evaluate when asked to stop while no worker is connected"""
+
+
+def authkey(key=None):
+    """the given key, or else the one in the environment; there is no default, the messages are pickles"""
+    return key or os.environ.get(u.AUTHKEY_VARIABLE)
+
+
+def _receive_timeout(connection, seconds):
+    """makes reads of a connection fail after seconds, 0 for never; a socket timeout would switch the
+    shared descriptor to non-blocking mode, which Connection does not expect"""
+    sock = socket.socket(fileno=os.dup(connection.fileno()))
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, struct.pack('ll', seconds, 0))
+    finally:
+        sock.close()
+
+
+def parse_address(address):
+    """'host:port' for TCP, anything else is the path of a Unix socket"""
+    host, separator, port = address.rpartition(':')
+    if separator and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def detach(neural_network):
+    method = getattr(neural_network, 'detached', None)
+    if method is None:
+        raise TypeError('distributed evaluation needs networks that can be sent to other processes '
+                        '(the numpy backend)')
+    return method()
+
+
+class DistributedEvaluator:
+    """scores networks on workers that connect over TCP or a Unix socket; a batch whose worker disconnects
+    or does not answer within timeout seconds goes back to the queue for another worker; should_stop is
+    asked while waiting for workers to connect"""
+
+    def __init__(self, address, authkey, batch_size=u.DISTRIBUTED_BATCH, timeout=u.DISTRIBUTED_TIMEOUT,
+                 should_stop=None):
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.should_stop = should_stop
+        self.truncated = []
+        self.stats = []  # per network, as sent back by the worker that evaluated it
+        self.resubmitted = 0
+
+        # authentication is done by _handshake, so that a silent connection cannot hold up the others
+        self._authkey = authkey
+        self._listener = Listener(address)
+        self.address = self._listener.address
+        self._processes = {}  # connected worker -> its evaluation processes
+        self._lock = threading.Lock()
+        self._closed = False
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handshake, args=(connection,), daemon=True).start()
+
+    def _handshake(self, connection):
+        """authenticates a new connection both ways and waits for its 'ready', within HANDSHAKE_TIMEOUT"""
+        try:
+            _receive_timeout(connection, HANDSHAKE_TIMEOUT)
+            deliver_challenge(connection, self._authkey)
+            answer_challenge(connection, self._authkey)
+            message = connection.recv() if connection.poll(HANDSHAKE_TIMEOUT) else None
+            _receive_timeout(connection, 0)
+        except (multiprocessing.AuthenticationError, EOFError, OSError):
+            message = None
+        if message is None or message[0] != 'ready' or self._closed:
+            connection.close()
+            return
+        with self._lock:
+            self._processes[connection] = max(int(message[1]), 1)
+
+    def workers(self):
+        with self._lock:
+            return len(self._processes)
+
+    def evaluate(self, networks, input_size, seeds=None, racing_bound=None):
+        if seeds is None:
+            seeds = [None] * len(networks)
+        tasks = [(detach(neural_network), seed) for neural_network, seed in zip(networks, seeds)]
+        pending = collections.deque(range(len(tasks)))
+        busy = {}  # worker -> (indices, deadline)
+        scores = [None] * len(tasks)
+        truncated = [False] * len(tasks)
+        stats = [None] * len(tasks)
+        remaining = len(tasks)
+
+        while remaining:
+            with self._lock:
+                idle = [connection for connection in self._processes if connection not in busy]
+            for connection in idle:
+                if not pending:
+                    break
+                indices = [pending.popleft() for _ in range(min(self._batch_size(connection), len(pending)))]
+                try:
+                    connection.send(('evaluate', input_size, racing_bound, [tasks[i] for i in indices]))
+                except OSError:
+                    self._lose(connection, indices, pending)
+                    continue
+                busy[connection] = (indices, time.monotonic() + self.timeout)
+
+            if not busy:
+                # nothing is running, so there is no generation to finish before stopping
+                if self.should_stop is not None and self.should_stop():
+                    raise Stopped('stopped while waiting for workers to connect')
+                time.sleep(0.05)  # waiting for a worker to connect
+                continue
+            for connection in wait(list(busy), timeout=1):
+                indices, _ = busy.pop(connection)
+                try:
+                    _, batch_scores, batch_truncated, batch_stats = connection.recv()
+                except (EOFError, OSError):
+                    self._lose(connection, indices, pending)
+                    continue
+                for i, score, cut_short in zip(indices, batch_scores, batch_truncated):
+                    scores[i] = score
+                    truncated[i] = cut_short
+                    stats[i] = batch_stats
+                remaining -= len(indices)
+
+            now = time.monotonic()
+            for connection, (indices, deadline) in list(busy.items()):
+                if now > deadline:
+                    del busy[connection]
+                    self._lose(connection, indices, pending)
+
+        self.truncated = truncated
+        self.stats = stats
+        return scores
+
+    def _batch_size(self, connection):
+        return self.batch_size or self._processes[connection]
+
+    def _lose(self, connection, indices, pending):
+        """drops a worker and queues its batch again, first in line"""
+        with self._lock:
+            self._processes.pop(connection, None)
+        connection.close()
+        pending.extendleft(reversed(indices))
+        self.resubmitted += len(indices)
+
+    def close(self):
+        """stops the connected workers and the listener"""
+        self._closed = True
+        with self._lock:
+            connections = list(self._processes)
+            self._processes.clear()
+        for connection in connections:
+            try:
+                connection.send(('stop',))
+            except OSError:
+                pass
+            connection.close()
+        self._listener.close()
+
+
+def _connect(address, authkey, retry):
+    deadline = time.monotonic() + retry
+    while True:
+        try:
+            return Client(address, authkey=authkey)
+        except (OSError, EOFError):
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(1)
+
+
+def work(address, authkey, processes=u.EVALUATION_WORKERS, batched=False, retry=u.DISTRIBUTED_RETRY):
+    """evaluates batches for a coordinator until it says stop; reconnects if the connection is lost"""
+    evaluator = BatchedEvaluator(workers=processes) if batched else ParallelEvaluator(processes)
+    host = socket.gethostname()
+    while True:
+        connection = _connect(address, authkey, retry)
+        if connection is None:
+            return
+        try:
+            connection.send(('ready', processes))
+            while True:
+                message = connection.recv()
+                if message[0] == 'stop':
+                    return
+                _, input_size, racing_bound, batch = message
+                start = time.perf_counter()
+                scores = evaluator.evaluate([network for network, _ in batch], input_size,
+                                            [seed for _, seed in batch], racing_bound=racing_bound)
+                connection.send(('scores', scores, list(evaluator.truncated),
+                                 {'host': host, 'networks': len(batch), 'seconds': time.perf_counter() - start}))
+        except (EOFError, OSError):
+            continue
+        finally:
+            connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate networks for a training coordinator '
+                                                 '(python -m self_organizing_network.train --listen ...).')
+    parser.add_argument('address', help='host:port or the path of a Unix socket the coordinator listens on')
+    parser.add_argument('--processes', type=int, default=u.EVALUATION_WORKERS, help='local evaluation processes')
+    parser.add_argument('--batched', action='store_true', help='evaluate episodes in lock-step batches')
+    parser.add_argument('--authkey', help='the key the coordinator printed, by default $' + u.AUTHKEY_VARIABLE)
+    parser.add_argument('--retry', type=float, default=u.DISTRIBUTED_RETRY,
+                        help='seconds to keep trying to reach the coordinator')
+    args = parser.parse_args()
+    key = authkey(args.authkey)
+    if key is None:
+        parser.error('--authkey or $%s is required' % u.AUTHKEY_VARIABLE)
+    work(parse_address(args.address), key.encode(), args.processes, args.batched, args.retry)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,158 @@
-import self_organizing_network.pyvolution as pv
+import os
+
+import self_organizing_network.numpy_evolution as numpy_evolution
+from self_organizing_network.fitness_cache import FitnessCache, fingerprint
+import self_organizing_network.utils as u
+
+
+BACKENDS = ['auto', 'pyvolution', 'numpy']
+
+
+def load_backend(name=u.EA_BACKEND):
+    """pyvolution.so needs Boost at runtime; 'auto' falls back to the NumPy implementation without it"""
+    if name == 'numpy':
+        return numpy_evolution
+    try:
+        import self_organizing_network.pyvolution as backend
+    except ImportError:
+        if name == 'pyvolution':
+            raise
+        return numpy_evolution
+    return backend
+
+
+def file_backend(path, name=u.EA_BACKEND):
+    """'auto' picks the backend that saved the file, the NumPy one writes zip archives"""
+    if name != 'auto':
+        return name
+    with open(path, 'rb') as file:
+        magic = file.read(2)
+    return 'numpy' if magic == b'PK' else name
 
 
 class EAController:
-    def __init__(self, stats_window):
+    INPUT_SIZE = 14
+    OUTPUT_SIZE = 3
+
+    def __init__(self, stats_window, backend=u.EA_BACKEND):
         self.stats_window = stats_window
+        self.backend = backend
         self.input_size = 0
         self.neural_network = None
         self.ea = None
+        self.profiler = None
+        self.checkpointer = None
+        self.fitness_cache = FitnessCache() if u.FITNESS_CACHE_SIZE else None
+        self.racing = u.RACING
+        # which networks of the last evaluated generation had their episode cut short by racing
+        self.truncated = []
+        self._previous_scores = None
 
-    def initialize_ea(self, parameters):
+    def initialize_ea(self, parameters, seed=None):
+        """seed only makes the NumPy backend reproducible, pyvolution draws its own"""
+        pv = load_backend(self.backend)
         p = pv.EvolutionaryAlgorithmParameters
         p.population_size = int(parameters[0])
         p.children_bred_per_generation = int(parameters[1])
         p.crossover_probability = float(parameters[2])
         p.mutation_probability = float(parameters[3])
         p.hidden_layers = int(parameters[4])
-        p.input_size = 14
-        p.output_size = 3
+        p.input_size = self.INPUT_SIZE
+        p.output_size = self.OUTPUT_SIZE
         p.weight_variance = float(parameters[5])
-        self.ea = pv.EvolutionaryAlgorithm(p)
+        self.neural_network = None
+        self.ea = pv.EvolutionaryAlgorithm(p, seed) if pv is numpy_evolution else pv.EvolutionaryAlgorithm(p)
         self.input_size = p.input_size
+        # the scores of another population must not set the racing bound of this one
+        self._previous_scores = None
+        self.truncated = []
         self.process()
 
     def get_current_network(self):
+        self._count_call()
         return self.ea.get_current_network()
 
     def get_current_generation(self):
+        self._count_call()
         return self.ea.get_current_generation()
 
+    def get_backend(self):
+        """the backend in use, never 'auto'"""
+        return 'numpy' if isinstance(self.ea, numpy_evolution.EvolutionaryAlgorithm) else 'pyvolution'
+
     def process(self):
+        self._count_call()
+        # the last network of a generation has its fitness: the next call breeds a new one
+        if self.checkpointer is not None and self.neural_network is not None \
+                and self.ea.get_current_network() == self.ea.get_population_size():
+            self.checkpointer.on_generation_evaluated(self)
         self.neural_network = self.ea.get_next()
 
+    def _count_call(self):
+        if self.profiler is not None:
+            self.profiler.count('pyvolution')
+
+    def pull_generation(self):
+        networks = [self.neural_network]
+        while self.get_current_network() < self.ea.get_population_size():
+            self.process()
+            networks.append(self.neural_network)
+        return networks
+
+    def evaluate_generation(self, evaluator, seed=None, record_directory=None):
+        """scores the networks left in the generation; with record_directory the episode of every
+        evaluated network is recorded into network_<index> below it"""
+        generation = self.get_current_generation()
+        first_network = self.get_current_network()
+        networks = self.pull_generation()
+        seeds = [None] * len(networks)
+        if seed is not None:
+            seeds = [u.derive_seed(seed, generation, first_network + i) for i in range(len(networks))]
+
+        # with common random numbers every network of the generation plays the same episode, a cached
+        # score from another one would spoil the comparison
+        cache = self.fitness_cache if not getattr(evaluator, 'common_random_numbers', False) else None
+        scores = [None] * len(networks)
+        keys = [None] * len(networks)
+        if cache is not None:
+            keys = [fingerprint(neural_network) for neural_network in networks]
+            scores = [cache.lookup(key, seed) if key is not None else None for key, seed in zip(keys, seeds)]
+
+        pending = [i for i, score in enumerate(scores) if score is None]
+        racing_bound = self._racing_bound() if self.racing else None
+        options = {}
+        if record_directory is not None:
+            options['record_directories'] = [os.path.join(record_directory, 'network_%03d' % (first_network + i))
+                                             for i in pending]
+        evaluated = evaluator.evaluate([networks[i] for i in pending], self.input_size, [seeds[i] for i in pending],
+                                       racing_bound=racing_bound, **options)
+        truncated = getattr(evaluator, 'truncated', None) or [False] * len(pending)
+
+        self.truncated = [False] * len(networks)
+        for i, score, cut_short in zip(pending, evaluated, truncated):
+            if cut_short:
+                self.truncated[i] = True
+            elif keys[i] is not None:
+                score = cache.add(keys[i], seeds[i], score)
+            scores[i] = score
+
+        for neural_network, score in zip(networks, scores):
+            neural_network.fitness = score
+        self._previous_scores = scores
+        if cache is not None and cache.path is not None:
+            cache.save()
+        return scores
+
+    def _racing_bound(self):
+        """score of the worst network that survived the last generation; a child scoring less is
+        among the first to be replaced"""
+        if self._previous_scores is None:
+            return None
+        survivors = len(self._previous_scores) - self.ea.get_children_bred_per_generation()
+        if survivors <= 0:
+            return None
+        return sorted(self._previous_scores, reverse=True)[survivors - 1]
+
     def save(self, path):
         if self.ea:
             self.ea.save(path)
@@ -39,10 +161,18 @@ class EAController:
             return False
 
     def load(self, filename):
-        self.ea = pv.EvolutionaryAlgorithm()
+        self.neural_network = None
+        self.ea = load_backend(file_backend(filename, self.backend)).EvolutionaryAlgorithm()
         self.ea.load(filename)
-        parameters = [self.ea.get_population_size(), self.ea.get_children_bred_per_generation(),
-                      self.ea.get_crossover_probability(), self.ea.get_mutation_probability(),
-                      self.ea.get_hidden_layers(), self.ea.get_weight_variance()]
+        self.input_size = self.INPUT_SIZE
+        self._previous_scores = None
+        self.truncated = []
+        parameters = self.get_parameters()
         self.process()
         return True, parameters
+
+    def get_parameters(self):
+        """the six values initialize_ea takes"""
+        return [self.ea.get_population_size(), self.ea.get_children_bred_per_generation(),
+                self.ea.get_crossover_probability(), self.ea.get_mutation_probability(),
+                self.ea.get_hidden_layers(), self.ea.get_weight_variance()]
@@ -1,18 +1,31 @@
-import matplotlib
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-from matplotlib import style
+import collections
+import os
+import pickle
+import threading
+
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import messagebox
-from self_organizing_network.ea_controller import EAController
+from self_organizing_network.ea_controller import EAController, BACKENDS
 from self_organizing_network.simulation_controller import SimulationController
+import self_organizing_network.checkpoint as checkpoint
+import self_organizing_network.network_agent as network_agent
+import self_organizing_network.profiler as profiler
+import self_organizing_network.training_curve as training_curve
 import self_organizing_network.labels as labels
+import self_organizing_network.utils as u
 
 
-matplotlib.rcParams.update({'font.size': 8})
-matplotlib.use('TkAgg')
-style.use('dark_background')
+def _load_matplotlib():
+    """matplotlib takes longer to import than the whole simulation, so only an opened window pays for it"""
+    import matplotlib
+    matplotlib.use('TkAgg')
+    matplotlib.rcParams.update({'font.size': 8})
+    from matplotlib import style
+    style.use('dark_background')
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.figure import Figure
+    return Figure, FigureCanvasTkAgg
 
 
 class EAWindow(tk.Tk):
@@ -21,23 +34,39 @@ class EAWindow(tk.Tk):
         self.wm_title(labels.title)
         self.resizable(0, 0)
         self.son_controller = EAController(stats_window=self)
-        self.sim_controller = SimulationController(stats_window=self)
+        self.sim_controller = SimulationController(stats_window=self, ea_controller=self.son_controller)
+        self.son_controller.checkpointer = checkpoint.Checkpointer(statistics=self._checkpoint_statistics)
 
-        self.mean_gen_score_x = []
-        self.mean_gen_score_y = []
-        self.best_gen_score_x = []
-        self.best_gen_score_y = []
+        self.best_curve = training_curve.CurveStore()
+        self.mean_curve = training_curve.CurveStore()
+        self._training_log = None
         self.best_score_overall = 0
         self.curr_gen_best = 0
         self.curr_gen_total_score = 0
+        self._current_generation = 0
+        self._current_network = 0
+        self._truncated_count = 0
+
+        # the simulation thread only publishes; the Tk main loop applies the latest state
+        self._stats_snapshots = collections.deque(maxlen=1)
+        self._plots_outdated = False
+        self._plot_lock = threading.Lock()
+
+        self._observations = network_agent.ObservationBuilder(input_size=EAController.INPUT_SIZE)
 
         self.eap_label_vars = []
         self.stat_label_vars = []
+        self.profile_label_var = None
+        self.profiling_var = None
 
+        Figure, self._canvas_class = _load_matplotlib()
         self.canvas = None
         self.fig = Figure(figsize=(5, 4), dpi=100, tight_layout={'h_pad': 3})
         self.best_gen_score = self.fig.add_subplot(2, 1, 1)
         self.mean_gen_score = self.fig.add_subplot(2, 1, 2)
+        self._best_line = None
+        self._mean_line = None
+        self._backgrounds = []
 
         frame = tk.Frame(self)
         frame.pack(side=tk.TOP, anchor='w')
@@ -57,12 +86,26 @@ class EAWindow(tk.Tk):
 
     def run(self):
         self.protocol("WM_DELETE_WINDOW", self._quit)
+        self.after(u.GUI_REFRESH_MS, self._refresh)
         self.mainloop()
 
+    def _refresh(self):
+        try:
+            self._update_stats(*self._stats_snapshots.pop())
+        except IndexError:
+            pass
+        if self._plots_outdated:
+            self._plots_outdated = False
+            self._update_plots()
+        self._update_profile()
+        self.after(u.GUI_REFRESH_MS, self._refresh)
+
     def start(self, headless):
         if self.son_controller.ea is not None:
             if self.sim_controller.current is not None:
                 self.stop()
+            self._current_generation = self.son_controller.get_current_generation()
+            self._current_network = self.son_controller.get_current_network()
             self.sim_controller.start(headless=headless)
         else:
             messagebox.showwarning(labels.msgbox_title[0], labels.msgbox_msg[0])
@@ -77,7 +120,7 @@ class EAWindow(tk.Tk):
                              lambda: self.start(headless=False),
                              self.stop, self.sim_controller.change_view,
                              self._enter_parameters, self._set_path_and_save,
-                             self._set_path_and_load, self._quit]
+                             self._set_path_and_load, self._set_path_and_resume, self._quit]
 
         for i in range(len(labels.buttons)):
             button = tk.Button(self.controls_frame, text=labels.buttons[i],
@@ -98,6 +141,8 @@ class EAWindow(tk.Tk):
                                          width=53, anchor="w"))
             stats_labels[i].pack(side=tk.TOP, anchor='w')
 
+        self._add_profile(stats_frame)
+
         params_frame = tk.LabelFrame(self.infos_frame, text=labels.frames[1])
         params_frame.pack(side=tk.TOP, anchor='e')
 
@@ -111,26 +156,45 @@ class EAWindow(tk.Tk):
                                          width=53, anchor="w"))
             param_labels[i].pack(anchor='nw')
 
+    def _add_profile(self, stats_frame):
+        self.profile_label_var = tk.StringVar()
+        self.profile_label_var.set(labels.profile_off)
+        profile_label = tk.Label(stats_frame, textvariable=self.profile_label_var,
+                                 width=53, anchor="w", justify=tk.LEFT)
+        profile_label.pack(side=tk.TOP, anchor='w')
+
+        profile_frame = tk.Frame(stats_frame)
+        profile_frame.pack(side=tk.TOP, anchor='w')
+        self.profiling_var = tk.BooleanVar()
+        tk.Checkbutton(profile_frame, text=labels.profile_toggle, variable=self.profiling_var,
+                       command=self._toggle_profiling).pack(side=tk.LEFT)
+        tk.Button(profile_frame, text=labels.profile_export, command=self._set_path_and_export_profile).pack(side=tk.LEFT)
+
     def _add_sliders(self):
         speed_slider_frame = tk.Frame(self.sliders_frame)
         speed_slider_frame.pack(side=tk.LEFT)
         speed_label = tk.Label(speed_slider_frame, text=labels.slider)
         speed_label.pack(side=tk.BOTTOM)
         self.speed_slider = tk.Scale(speed_slider_frame, orient='horizontal', length=350, width=10,
-                                     from_=1, to=10, resolution=0.1, command=self.sim_controller.change_speed)
+                                     from_=1, to=100, resolution=0.1, command=self.sim_controller.change_speed)
         self.speed_slider.pack(side=tk.BOTTOM)
 
     def _add_plot(self):
-        self.canvas = FigureCanvasTkAgg(self.fig, self)
+        self.canvas = self._canvas_class(self.fig, self)
+        # the curves are animated: full redraws leave them out and they are blitted on top
+        self._best_line, = self.best_gen_score.plot([], [], animated=True)
+        self._mean_line, = self.mean_gen_score.plot([], [], animated=True)
+        self.best_gen_score.set_title(labels.plot_title[0])
+        self.best_gen_score.set_xlabel(labels.plot_xlabel)
+        self.mean_gen_score.set_title(labels.plot_title[1])
+        self.mean_gen_score.set_xlabel(labels.plot_xlabel)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
         self.canvas.show()
         self.canvas.get_tk_widget().pack(side=tk.BOTTOM)
-        self._update_plots()
 
     def _enter_parameters(self):
         param_frame = tk.Toplevel()
-        default_values = [10, 4,
-                          1, 0.5,
-                          3, 10.0]
+        default_values = u.DEFAULT_EA_PARAMETERS
         entries = []
 
         for i in range(len(labels.params)):
@@ -140,9 +204,14 @@ class EAWindow(tk.Tk):
             entries[i].insert(0, default_values[i])
             entries[i].grid(row=i, column=1)
 
+        backend = tk.StringVar(value=self.son_controller.backend)
+        tk.Label(param_frame, text=labels.backend).grid(row=len(labels.params), column=0)
+        tk.OptionMenu(param_frame, backend, *BACKENDS).grid(row=len(labels.params), column=1)
+
         create_button = tk.Button(
             param_frame, text=labels.create_button,
-            command=lambda: [self.son_controller.initialize_ea(self._extract_str_from_entries(entries)),
+            command=lambda: [setattr(self.son_controller, 'backend', backend.get()),
+                             self.son_controller.initialize_ea(self._extract_str_from_entries(entries)),
                              self._update_ea_parameters(self._extract_str_from_entries(entries)),
                              self._reset_plots(),
                              param_frame.destroy()])
@@ -157,22 +226,58 @@ class EAWindow(tk.Tk):
             self.eap_label_vars[i].set(labels.params[i] + str(parameters[i]))
 
     def _update_stats(self, current_gen_num, current_nn_num, current_score, current_output):
-        current_probs = [(x, round(y, 3)) for x, y in zip(["+", "=", "-"], current_output)]
+        current_probs = [(x, round(float(y), 3)) for x, y in zip(["+", "=", "-"], current_output)]
 
         current_stats = [current_gen_num,
                          current_nn_num,
                          current_score,
                          self.best_score_overall,
+                         self._truncated_count,
                          current_probs]
 
         for i in range(len(self.stat_label_vars)):
             self.stat_label_vars[i].set(labels.stats[i] + str(current_stats[i]))
 
+    def _toggle_profiling(self):
+        self.sim_controller.set_profiling(self.profiling_var.get())
+        self._update_profile()
+
+    def _update_profile(self):
+        if self.sim_controller.profiler is None:
+            self.profile_label_var.set(labels.profile_off)
+            return
+
+        summary = self.sim_controller.profiler.summary()
+        lines = [labels.profile_header]
+        for phase, name in zip(profiler.PHASES, labels.profile_phases):
+            if phase in summary['phases']:
+                statistics = summary['phases'][phase]
+                lines.append('  %s: %.1f / %.1f' % (name, statistics['mean_us'], statistics['p95_us']))
+        lines.append(labels.profile_calls + ', '.join('%s %.2f' % item for item in summary['calls_per_tick'].items()))
+        for label, section in zip(labels.profile_wall_times, ['episode_s', 'generation_s']):
+            if summary[section]['count']:
+                lines.append(label + '%.2f' % summary[section]['mean'])
+        self.profile_label_var.set('\n'.join(lines))
+
+    def _set_path_and_export_profile(self):
+        if self.sim_controller.profiler is None:
+            messagebox.showwarning(labels.msgbox_title[4], labels.msgbox_msg[6])
+            return
+        path = filedialog.asksaveasfilename(filetypes=labels.profile_filetype,
+                                            initialfile=labels.profile_initialfilename)
+        if len(path) == 0:  # dialog closed with "cancel".
+            return
+        self.sim_controller.profiler.dump(path)
+        messagebox.showinfo(labels.msgbox_title[4], labels.msgbox_msg[7])
+
     def _quit(self):
         if self.sim_controller.current is not None:
             messagebox.showwarning(labels.msgbox_title[3], labels.msgbox_msg[5])
         else:
             self.stop()
+            self.son_controller.checkpointer.wait()
+            if self._training_log is not None:
+                self._training_log.close()
             self.quit()
             self.destroy()
 
@@ -197,76 +302,92 @@ class EAWindow(tk.Tk):
         else:
             messagebox.showwarning(labels.msgbox_title[2], labels.msgbox_msg[4])
 
+    def _set_path_and_resume(self):
+        path = filedialog.askopenfilename(filetypes=labels.checkpoint_filetype, initialdir=u.CHECKPOINT_DIR)
+        if len(path) == 0:  # dialog closed with "cancel".
+            return
+        try:
+            parameters, statistics = checkpoint.resume(path, self.son_controller)
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError):
+            messagebox.showwarning(labels.msgbox_title[5], labels.msgbox_msg[9])
+            return
+        self._update_ea_parameters(parameters)
+        self._restore_statistics(statistics)
+        messagebox.showinfo(labels.msgbox_title[5], labels.msgbox_msg[8])
+
+    def _checkpoint_statistics(self):
+        with self._plot_lock:
+            return {'best_score_overall': self.best_score_overall,
+                    'best_curve': self.best_curve.state(),
+                    'mean_curve': self.mean_curve.state(),
+                    'training_log': self._training_log.path if self._training_log is not None else None}
+
+    def _restore_statistics(self, statistics):
+        self._reset_plots()
+        if statistics is None:
+            return
+        with self._plot_lock:
+            self.best_score_overall = statistics['best_score_overall']
+            self.best_curve = training_curve.CurveStore.from_state(statistics['best_curve'])
+            self.mean_curve = training_curve.CurveStore.from_state(statistics['mean_curve'])
+            if statistics['training_log'] is not None and os.path.exists(statistics['training_log']):
+                self._training_log.close()
+                os.remove(self._training_log.path)
+                self._training_log = training_curve.TrainingLog(statistics['training_log'],
+                                                                records=self.best_curve.count)
+        self._update_plots()
+
     def on_finish(self):
         current_score = self.sim_controller.current.score
         self._update_scores(current_score)
         self.son_controller.neural_network.fitness = current_score
         self.son_controller.process()
+        self._current_generation = self.son_controller.get_current_generation()
+        self._current_network = self.son_controller.get_current_network()
+
+    def on_generation(self, generation, scores, truncated=None):
+        population_size = self.son_controller.ea.get_population_size()
+        if truncated is None:
+            truncated = self.son_controller.truncated
+        # scores of episodes cut short by racing say nothing about a network's quality
+        completed = [score for score, cut_short in zip(scores, truncated) if not cut_short]
+        self._truncated_count = len(scores) - len(completed)
+        for score in completed:
+            self._compare_scores(score)
+        self._stats_snapshots.append((generation, population_size, scores[-1], []))
+        self._finish_generation(generation, max(len(completed), 1))
 
-    def on_tick(self, base_station, mobile_stations):
+    def on_tick(self, simulation, base_station):
         neural_network = self.son_controller.neural_network
         if neural_network is None:
             return
 
-        sim_state = []
-
-        if base_station.is_on():
-            sim_state.append(base_station.get_power() / 1000)
-            sim_state.append(len(base_station.get_mobile_stations()))
-        else:
-            sim_state.append(0)
-            sim_state.append(0)
-
-        for neighbour in base_station.get_neighbours():
-            if neighbour is not None and neighbour.is_on():
-                sim_state.append(neighbour.get_power() / base_station.get_power())
-                if len(neighbour.get_mobile_stations()) > 0:
-                    sim_state.append(1)
-                else:
-                    sim_state.append(0)
-            else:
-                sim_state.append(0)
-                sim_state.append(0)
-
-        # for ms in mobile_stations:
-        #     if ms.base_station is base_station:
-        #         sim_state.append(ms.power)
-        #     else:
-        #         sim_state.append(0)
-
-        self._fill_with_zeros(sim_state)
+        sim_state = self._observations.build(simulation, base_station)
 
         output_vector = self.sim_controller.predict_power_change(neural_network=neural_network,
-                                                                 input_vector=sim_state)
+                                                                 input_vector=sim_state,
+                                                                 profiler=simulation.profiler)
 
-        for i in range(len(output_vector)):
-            output_vector[i] = round(output_vector[i], 3)
+        self._stats_snapshots.append((self._current_generation, self._current_network,
+                                      simulation.score, output_vector))
 
-        #print("INPUT: ", sim_state)
-        #print("OUTPUT: ", output_vector)
+        return network_agent.to_power_change(output_vector)
 
-        if self.sim_controller.current is not None:
-            self._update_stats(self.son_controller.get_current_generation(),
-                               self.son_controller.get_current_network(),
-                               self.sim_controller.current.score,
-                               output_vector)
-
-        POWER_RESOLUTION = 100
-        action = max(output_vector)
-        if output_vector.count(action) == 1:
-            action_index = output_vector.index(action)
-            if action_index == 0:
-                return action * POWER_RESOLUTION
-            elif action_index == 1:
-                return 0
-            elif action_index == 2:
-                return - action * POWER_RESOLUTION
-        return 0
-
-    def _fill_with_zeros(self, input_vector):
-        input_vector_size = len(input_vector)
-        if input_vector_size < self.son_controller.input_size:
-            input_vector += [0] * (self.son_controller.input_size - input_vector_size)
+    def on_synchronous_tick(self, simulation):
+        neural_network = self.son_controller.neural_network
+        if neural_network is None:
+            return 0
+
+        input_matrix = self._observations.build(simulation)
+
+        output_matrix = self.sim_controller.predict_power_changes(neural_network=neural_network,
+                                                                  input_matrix=input_matrix,
+                                                                  profiler=simulation.profiler)
+
+        self._stats_snapshots.append((self._current_generation, self._current_network,
+                                      simulation.score, output_matrix.mean(axis=0)))
+
+        return network_agent.to_power_changes(output_matrix)
 
     def _update_scores(self, score):
         current_network_number = self.son_controller.get_current_network()
@@ -277,12 +398,18 @@ class EAWindow(tk.Tk):
             self._compare_scores(score)
         elif current_network_number == population_size:
             self._compare_scores(score)
-            self._update_plot_stats(generation=current_generation_number,
-                                    gen_best=self.curr_gen_best,
-                                    gen_avg=self.curr_gen_total_score/population_size)
-            self._update_plots()
-            self.curr_gen_total_score = 0
-            self.curr_gen_best = 0
+            self._finish_generation(current_generation_number, population_size)
+            if self.sim_controller.profiler is not None:
+                self.sim_controller.profiler.finish_generation()
+                self.sim_controller.profiler.start_generation()
+
+    def _finish_generation(self, generation, population_size):
+        self._update_plot_stats(generation=generation,
+                                gen_best=self.curr_gen_best,
+                                gen_avg=self.curr_gen_total_score/population_size)
+        self._plots_outdated = True
+        self.curr_gen_total_score = 0
+        self.curr_gen_best = 0
 
     def _compare_scores(self, score):
         if score > self.curr_gen_best:
@@ -292,36 +419,70 @@ class EAWindow(tk.Tk):
         self.curr_gen_total_score += score
 
     def _update_plot_stats(self, generation, gen_best, gen_avg):
-        self.best_gen_score_y.append(gen_best)
-        self.best_gen_score_x.append(generation)
-        self.mean_gen_score_y.append(gen_avg)
-        self.mean_gen_score_x.append(generation)
+        with self._plot_lock:
+            self.best_curve.append(generation, gen_best)
+            self.mean_curve.append(generation, gen_avg)
+            if self._training_log is not None:
+                self._training_log.append(generation, gen_best, gen_avg)
 
     def _update_plots(self):
-        self._clear_plots()
-        self.best_gen_score.plot(self.best_gen_score_x, self.best_gen_score_y)
-        self.mean_gen_score.plot(self.mean_gen_score_x, self.mean_gen_score_y)
-        self.best_gen_score.set_title(labels.plot_title[0])
-        self.best_gen_score.set_xlabel(labels.plot_xlabel)
-        self.mean_gen_score.set_title(labels.plot_title[1])
-        self.mean_gen_score.set_xlabel(labels.plot_xlabel)
-        self.canvas.draw()
+        with self._plot_lock:
+            best = self.best_curve.points()
+            mean = self.mean_curve.points()
+        self._best_line.set_data(*best)
+        self._mean_line.set_data(*mean)
+
+        rescaled = self._rescale(self.best_gen_score, *best)
+        rescaled = self._rescale(self.mean_gen_score, *mean) or rescaled
+        if rescaled:
+            self.canvas.draw()
+            return
 
-    def _reset_plots(self):
-        self._clear_plots()
-        self.best_gen_score_x = []
-        self.mean_gen_score_x = []
-        self.best_gen_score_y = []
-        self.mean_gen_score_y = []
-        self._update_plots()
+        for background in self._backgrounds:
+            self.canvas.restore_region(background)
+        self._draw_lines()
+        self.canvas.blit(self.best_gen_score.bbox)
+        self.canvas.blit(self.mean_gen_score.bbox)
+
+    def _on_draw(self, event):
+        """a full redraw invalidates the backgrounds the curves are blitted onto"""
+        self._backgrounds = [self.canvas.copy_from_bbox(self.best_gen_score.bbox),
+                             self.canvas.copy_from_bbox(self.mean_gen_score.bbox)]
+        self._draw_lines()
 
-    def _clear_plots(self):
-        self.mean_gen_score.clear()
-        self.best_gen_score.clear()
+    def _draw_lines(self):
+        self.best_gen_score.draw_artist(self._best_line)
+        self.mean_gen_score.draw_artist(self._mean_line)
 
+    @staticmethod
+    def _rescale(axes, x, y):
+        """widens the axes with headroom once the curve leaves them, so full redraws stay rare"""
+        if len(x) == 0:
+            return False
+        x_low, x_high = axes.get_xlim()
+        y_low, y_high = axes.get_ylim()
+        if x_low <= x.min() and x.max() <= x_high and y_low <= y.min() and y.max() <= y_high:
+            return False
+
+        y_span = max(y.max() - y.min(), 1)
+        axes.set_xlim(x.min(), x.min() + max(2 * (x.max() - x.min()), 10))
+        axes.set_ylim(y.min() - y_span / 2, y.max() + y_span / 2)
+        return True
 
-machine_gaming = EAWindow()
+    def _reset_plots(self):
+        with self._plot_lock:
+            self.best_curve = training_curve.CurveStore()
+            self.mean_curve = training_curve.CurveStore()
+            if self._training_log is not None:
+                self._training_log.close()
+            self._training_log = training_curve.TrainingLog(training_curve.new_log_path())
+        for axes in [self.best_gen_score, self.mean_gen_score]:
+            axes.set_xlim(0, 1)
+            axes.set_ylim(0, 1)
+        self._best_line.set_data([], [])
+        self._mean_line.set_data([], [])
+        self.canvas.draw()
 
 
 if __name__ == '__main__':
-    machine_gaming.run()
+    EAWindow().run()
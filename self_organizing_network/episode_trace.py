@@ -0,0 +1,140 @@
+import json
+import os
+
+import numpy as np
+import self_organizing_network.utils as u
+
+
+META_FILE = 'meta.json'
+INITIAL_STATE_FILE = 'initial.npz'
+CHUNK_TICKS = 1024
+
+
+def episode_directory(directory, episode):
+    return os.path.join(directory, 'episode_%05d' % episode)
+
+
+def _columns(bs_count, ms_count):
+    """name -> (dtype, shape of one tick); every column is stored in its own raw file"""
+    assignment_dtype = np.int16 if bs_count < np.iinfo(np.int16).max else np.int32
+    return {'score_delta': (np.float64, ()),
+            'times_disconnected': (np.int32, ()),
+            'action_station': (np.int32, ()),
+            'power_change': (np.float32, (bs_count,)),
+            'power': (np.float32, (bs_count,)),
+            'assignment': (assignment_dtype, (ms_count,))}
+
+
+class TraceRecorder:
+    """writes every episode of a SimulationEngine into its own columnar trace directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._path = None
+        self._files = {}
+        self._buffers = {}
+        self._buffered = 0
+        self._ticks = 0
+        self._last_score = 0
+        self._meta = None
+
+    def on_reset(self, simulation):
+        self.close()
+        self._path = episode_directory(self.directory, simulation.episode)
+        os.makedirs(self._path, exist_ok=True)
+
+        np.savez(os.path.join(self._path, INITIAL_STATE_FILE),
+                 bs_coordinates=simulation.bs_coordinates,
+                 bs_power=simulation.bs_power,
+                 ms_coordinates=simulation.ms_coordinates,
+                 ms_velocity=simulation.ms_velocity)
+
+        columns = _columns(len(simulation.bs_power), simulation.ms_count)
+        self._meta = {'episode': simulation.episode,
+                      'seed': simulation.seed,
+                      'rows': simulation.rows,
+                      'cols': simulation.cols,
+                      'size': simulation.size,
+                      'synchronous': bool(simulation.synchronous),
+                      'bs_count': len(simulation.bs_power),
+                      'ms_count': simulation.ms_count,
+                      'columns': {name: {'dtype': np.dtype(dtype).str, 'shape': list(shape)}
+                                  for name, (dtype, shape) in columns.items()}}
+        self._write_meta()
+
+        self._files = {name: open(os.path.join(self._path, name + '.bin'), 'wb') for name in columns}
+        self._buffers = {name: np.zeros((CHUNK_TICKS,) + shape, dtype=dtype)
+                         for name, (dtype, shape) in columns.items()}
+        self._buffered = 0
+        self._ticks = 0
+        self._last_score = 0
+
+    def on_tick(self, simulation):
+        row = self._buffered
+        self._buffers['score_delta'][row] = simulation.score - self._last_score
+        self._buffers['times_disconnected'][row] = simulation.times_disconnected
+        self._buffers['action_station'][row] = simulation.action_station
+        power_change = self._buffers['power_change'][row]
+        if simulation.action_station != u.NO_BASE_STATION:
+            power_change[:] = 0
+            power_change[simulation.action_station] = simulation.power_change
+        else:
+            power_change[:] = simulation.power_change
+        self._buffers['power'][row] = simulation.bs_power
+        self._buffers['assignment'][row] = simulation.ms_base_station
+
+        self._last_score = simulation.score
+        self._buffered += 1
+        self._ticks += 1
+        if self._buffered == CHUNK_TICKS:
+            self._flush()
+
+    def close(self):
+        if not self._files:
+            return
+        self._flush()
+        for file in self._files.values():
+            file.close()
+        self._files = {}
+        self._meta['ticks'] = self._ticks
+        self._write_meta()
+
+    def _flush(self):
+        for name, file in self._files.items():
+            self._buffers[name][:self._buffered].tofile(file)
+            file.flush()
+        self._buffered = 0
+
+    def _write_meta(self):
+        with open(os.path.join(self._path, META_FILE), 'w') as file:
+            json.dump(self._meta, file, indent=1)
+
+
+class Trace:
+    """memory-mapped view of one recorded episode; columns are indexed by tick"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as file:
+            self.meta = json.load(file)
+        with np.load(os.path.join(path, INITIAL_STATE_FILE)) as initial:
+            self.initial = {name: initial[name] for name in initial.files}
+
+        self.columns = {}
+        for name, column in self.meta['columns'].items():
+            dtype = np.dtype(column['dtype'])
+            shape = tuple(column['shape'])
+            file_name = os.path.join(path, name + '.bin')
+            # a crashed run leaves no tick count behind, so it is taken from the file size
+            ticks = os.path.getsize(file_name) // (dtype.itemsize * int(np.prod(shape, dtype=np.int64)) or 1)
+            if ticks == 0:
+                self.columns[name] = np.zeros((0,) + shape, dtype=dtype)
+            else:
+                self.columns[name] = np.memmap(file_name, dtype=dtype, mode='r', shape=(ticks,) + shape)
+        self.ticks = min(len(column) for column in self.columns.values())
+
+    def __getitem__(self, name):
+        return self.columns[name][:self.ticks]
+
+    def scores(self):
+        return np.cumsum(self['score_delta'])
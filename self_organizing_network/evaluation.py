@@ -0,0 +1,205 @@
+import multiprocessing
+import os
+import random
+import signal
+
+import numpy as np
+import self_organizing_network.utils as u
+from self_organizing_network.batched_simulation import BatchedSimulation
+from self_organizing_network.episode_trace import TraceRecorder
+from self_organizing_network.network_agent import NetworkAgent
+from self_organizing_network.simulation_engine import SimulationEngine
+
+
+# networks of the generation being evaluated; forked workers inherit them, so the
+# pyvolution objects never have to be pickled
+_networks = []
+_seeds = []
+_input_size = 0
+_racing_bound = None
+_record_directories = []
+_batches = []
+
+
+class Episode:
+    def __init__(self, tick_listener, seed=None, recorder=None, racing_bound=None):
+        self.simulation = SimulationEngine(finish_listener=self, tick_listener=tick_listener,
+                                           seed=seed, recorder=recorder)
+        self.simulation.racing_bound = racing_bound
+        self.score = None
+        self.truncated = False
+
+    def run(self):
+        self.simulation.run()
+        return self.score
+
+    def on_finish(self):
+        self.score = self.simulation.score
+        self.truncated = self.simulation.truncated
+        self.simulation.running = False
+
+
+def evaluate(neural_network, input_size, seed=None):
+    return Episode(NetworkAgent(neural_network, input_size), seed=seed).run()
+
+
+def _race(neural_network, input_size, seed, racing_bound, record_directory=None):
+    """score of one episode and whether racing cut it short"""
+    recorder = TraceRecorder(record_directory) if record_directory is not None else None
+    episode = Episode(NetworkAgent(neural_network, input_size), seed=seed, recorder=recorder,
+                      racing_bound=racing_bound)
+    return episode.run(), episode.truncated
+
+
+def _init_worker():
+    random.seed()
+    # schedulers and terminals signal the whole process group; a worker dying mid-task would leave
+    # Pool.map waiting forever, so it is up to the parent to react
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _map(function, tasks, workers):
+    pool = multiprocessing.get_context('fork').Pool(workers, initializer=_init_worker)
+    try:
+        return pool.map(function, tasks, chunksize=1)
+    finally:
+        # the workers ignore SIGTERM, so they are let finish instead of being terminated
+        pool.close()
+        pool.join()
+
+
+def _evaluate_at(index):
+    return _race(_networks[index], _input_size, _seeds[index], _racing_bound, _record_directories[index])
+
+
+class ParallelEvaluator:
+    def __init__(self, workers=u.EVALUATION_WORKERS):
+        self.workers = workers
+        self.truncated = []
+
+    def evaluate(self, networks, input_size, seeds=None, racing_bound=None, record_directories=None):
+        """scores of the networks; truncated tells which episodes racing cut short; with record_directories
+        every episode is recorded into its own one"""
+        global _networks, _seeds, _input_size, _racing_bound, _record_directories
+
+        if seeds is None:
+            seeds = [None] * len(networks)
+        if record_directories is None:
+            record_directories = [None] * len(networks)
+
+        if self.workers <= 1 or len(networks) <= 1 \
+                or 'fork' not in multiprocessing.get_all_start_methods():
+            results = [_race(neural_network, input_size, seed, racing_bound, record_directory)
+                       for neural_network, seed, record_directory in zip(networks, seeds, record_directories)]
+        else:
+            _networks = networks
+            _seeds = seeds
+            _input_size = input_size
+            _racing_bound = racing_bound
+            _record_directories = record_directories
+            try:
+                results = _map(_evaluate_at, range(len(networks)), min(self.workers, len(networks)))
+            finally:
+                _networks = []
+
+        self.truncated = [truncated for _, truncated in results]
+        return [score for score, _ in results]
+
+
+def evaluate_batch(networks, input_size, seeds, racing_bound=None):
+    """scores of the episodes and whether racing cut them short"""
+    simulation = BatchedSimulation(networks, seeds, input_size, racing_bound=racing_bound)
+    return simulation.run(), simulation.truncated
+
+
+def _evaluate_batch_at(index):
+    networks, seeds = _batches[index]
+    return evaluate_batch(networks, _input_size, seeds, _racing_bound)
+
+
+class BatchedEvaluator:
+    """runs samples episodes of every network in lock-step batches, one batch per worker, and
+    scores each network with its mean"""
+
+    def __init__(self, samples=u.EVALUATION_SAMPLES, common_random_numbers=u.COMMON_RANDOM_NUMBERS,
+                 workers=u.EVALUATION_WORKERS):
+        self.samples = samples
+        self.common_random_numbers = common_random_numbers
+        self.workers = workers
+        self.truncated = []
+
+    def evaluate(self, networks, input_size, seeds=None, racing_bound=None):
+        global _batches, _input_size, _racing_bound
+
+        if not networks:
+            self.truncated = []
+            return []
+        if seeds is None:
+            seeds = [None] * len(networks)
+        if self.common_random_numbers:
+            seed = seeds[0] if seeds[0] is not None else random.getrandbits(64)
+            seeds = [seed] * len(networks)
+
+        episode_networks = [network for network in networks for _ in range(self.samples)]
+        episode_seeds = [self._sample_seed(seed, sample) for seed in seeds for sample in range(self.samples)]
+
+        batches = min(self.workers, len(episode_networks))
+        if batches <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            scores, truncated = evaluate_batch(episode_networks, input_size, episode_seeds, racing_bound)
+        else:
+            bounds = np.linspace(0, len(episode_networks), batches + 1).astype(int)
+            _batches = [(episode_networks[start:end], episode_seeds[start:end])
+                        for start, end in zip(bounds[:-1], bounds[1:])]
+            _input_size = input_size
+            _racing_bound = racing_bound
+            try:
+                results = _map(_evaluate_batch_at, range(batches), batches)
+            finally:
+                _batches = []
+            scores = np.concatenate([batch_scores for batch_scores, _ in results])
+            truncated = np.concatenate([batch_truncated for _, batch_truncated in results])
+
+        self.truncated = np.reshape(truncated, (len(networks), self.samples)).any(axis=1).tolist()
+        return np.reshape(scores, (len(networks), self.samples)).mean(axis=1).tolist()
+
+    @staticmethod
+    def _sample_seed(seed, sample):
+        # the first sample is the episode a single evaluation with that seed would run
+        if seed is None or sample == 0:
+            return seed
+        return u.derive_seed(seed, 'sample', sample)
+
+
+class GenerationRunner:
+    def __init__(self, ea_controller, generation_listener=None, workers=u.EVALUATION_WORKERS, seed=None,
+                 evaluator=None, record_directory=None):
+        self._ea_controller = ea_controller
+        self.seed = seed
+        self.record_directory = record_directory  # every episode is recorded under it, one directory per generation
+        self._generation_listener = generation_listener
+        self._evaluator = evaluator if evaluator is not None else ParallelEvaluator(workers)
+        if record_directory is not None and not isinstance(self._evaluator, ParallelEvaluator):
+            # batched and distributed episodes run where no TraceRecorder can follow them
+            raise ValueError('only episodes evaluated by a ParallelEvaluator can be recorded')
+        self.profiler = None
+        self.score = 0
+        self.running = False
+
+    def run(self):
+        self.running = True
+        while self.running:
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.start_generation()
+            generation = self._ea_controller.get_current_generation()
+            record_directory = None
+            if self.record_directory is not None:
+                record_directory = os.path.join(self.record_directory, 'generation_%05d' % generation)
+            scores = self._ea_controller.evaluate_generation(self._evaluator, self.seed, record_directory)
+            self.score = scores[-1]
+            if profiler is not None:
+                profiler.finish_generation()
+            if self._generation_listener is not None:
+                self._generation_listener.on_generation(generation, scores)
+            self._ea_controller.process()
@@ -0,0 +1,86 @@
+import collections
+import json
+import os
+
+import self_organizing_network.utils as u
+
+
+def fingerprint(neural_network):
+    """hash of a network's weights, or None for networks that do not expose them (pyvolution)"""
+    method = getattr(neural_network, 'fingerprint', None)
+    return method() if method is not None else None
+
+
+class FitnessCache:
+    """scores of evaluated genomes per evaluation seed, least recently used genomes evicted first;
+    a genome with enough samples is not evaluated again, its mean score is reused. Unseeded episodes
+    all differ, their scores are kept as a list of samples"""
+
+    def __init__(self, capacity=u.FITNESS_CACHE_SIZE, samples=u.FITNESS_SAMPLES, path=None):
+        self.capacity = capacity
+        self.samples = samples
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def lookup(self, key, seed=None):
+        scores = self._entries.get(key)
+        if scores is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        if seed is not None and str(seed) in scores:
+            self.hits += 1
+            return scores[str(seed)]
+        samples = _samples(scores)
+        if len(samples) >= self.samples:
+            self.hits += 1
+            return sum(samples) / len(samples)
+        self.misses += 1
+        return None
+
+    def add(self, key, seed, score):
+        """stores a new sample and returns the genome's mean score"""
+        scores = self._entries.setdefault(key, {})
+        if seed is None:
+            scores.setdefault('None', []).append(score)
+        else:
+            scores[str(seed)] = score
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        samples = _samples(scores)
+        return sum(samples) / len(samples)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def state(self):
+        return [(key, {seed: list(score) if isinstance(score, list) else score for seed, score in scores.items()})
+                for key, scores in self._entries.items()]
+
+    def restore(self, state):
+        self._entries = collections.OrderedDict(state)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        partial = self.path + '.partial'
+        with open(partial, 'w') as file:
+            json.dump(self.state(), file)
+        os.replace(partial, self.path)
+
+    def load(self):
+        with open(self.path) as file:
+            self.restore(json.load(file))
+
+
+def _samples(scores):
+    """every score of a genome, those of unseeded episodes included"""
+    samples = []
+    for score in scores.values():
+        samples.extend(score if isinstance(score, list) else [score])
+    return samples
@@ -0,0 +1,134 @@
+import multiprocessing
+import random
+from multiprocessing.connection import wait
+
+import numpy as np
+import self_organizing_network.utils as u
+from self_organizing_network.ea_controller import EAController
+from self_organizing_network.evaluation import ParallelEvaluator
+
+
+TOPOLOGIES = ['ring', 'random']
+
+
+def destinations(islands, topology, generator=random):
+    """island receiving the migrants of every island"""
+    if topology == 'ring':
+        return [(island + 1) % islands for island in range(islands)]
+    return [generator.choice([other for other in range(islands) if other != island]) for island in range(islands)]
+
+
+def _island(index, parameters, seed, migration_interval, migrants, workers, racing, connection):
+    """evolves one population; after every migration_interval-th generation it sends its best networks and
+    waits for the ones it receives before breeding"""
+    island_seed = u.derive_seed(seed, 'island', index) if seed is not None else None
+    random.seed(island_seed)
+    np.random.seed(island_seed % 2 ** 32 if island_seed is not None else None)
+
+    # migrating means reading and writing weights, which only the NumPy backend allows
+    ea_controller = EAController(stats_window=None, backend='numpy')
+    ea_controller.racing = racing
+    ea_controller.initialize_ea(parameters, seed=island_seed)
+    evaluator = ParallelEvaluator(workers)
+    while not connection.poll():
+        generation = ea_controller.get_current_generation()
+        scores = ea_controller.evaluate_generation(evaluator, island_seed)
+        migrating = migrants > 0 and generation % migration_interval == 0
+        emigrants = ea_controller.ea.emigrants(migrants) if migrating else None
+        connection.send(('generation', index, generation, scores, ea_controller.truncated, emigrants))
+        if migrating:
+            message = connection.recv()
+            if message[0] == 'stop':
+                break
+            for tensors, fitness in message[1]:
+                ea_controller.ea.immigrate(tensors, fitness)
+        ea_controller.process()
+    connection.close()
+
+
+class IslandModel:
+    """populations, each driven by its own EAController, evolving in their own processes and exchanging
+    their best networks every migration_interval generations; listens like GenerationRunner, with the
+    scores of all islands"""
+
+    def __init__(self, parameters, generation_listener=None, islands=u.ISLANDS,
+                 migration_interval=u.MIGRATION_INTERVAL, migrants=u.MIGRANTS, topology=u.MIGRATION_TOPOLOGY,
+                 seed=None, workers=1, racing=u.RACING):
+        if topology not in TOPOLOGIES:
+            raise ValueError('unknown migration topology ' + topology)
+        self.parameters = parameters
+        self.islands = islands
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.topology = topology
+        self.seed = seed
+        self.workers = workers  # evaluation processes per island
+        self.racing = racing
+        self._generation_listener = generation_listener
+        self._random = random.Random(u.derive_seed(seed, 'migration') if seed is not None else None)
+        self.truncated = []
+        self.score = 0
+        self.running = False
+
+    def run(self):
+        self.running = True
+        context = multiprocessing.get_context('fork')
+        connections = []
+        processes = []
+        for index in range(self.islands):
+            connection, island_connection = context.Pipe()
+            process = context.Process(target=_island, args=(index, self.parameters, self.seed,
+                                                            self.migration_interval, self.migrants, self.workers,
+                                                            self.racing, island_connection))
+            process.start()
+            island_connection.close()
+            connections.append(connection)
+            processes.append(process)
+
+        reports = {}  # generation -> island -> (scores, truncated, emigrants)
+        try:
+            while self.running:
+                generation = min(reports) if reports else None
+                if generation is not None and len(reports[generation]) == self.islands:
+                    self._finish_generation(generation, reports.pop(generation), connections)
+                    continue
+                for connection in wait(connections, timeout=1):
+                    _, index, island_generation, scores, truncated, emigrants = connection.recv()
+                    reports.setdefault(island_generation, {})[index] = (scores, truncated, emigrants)
+        finally:
+            self._stop(connections, processes)
+
+    @staticmethod
+    def _stop(connections, processes):
+        for connection in connections:
+            try:
+                connection.send(('stop',))
+            except OSError:
+                pass
+        # reports sent in the meantime are read, so that no island blocks on a full pipe
+        open_connections = list(connections)
+        while open_connections:
+            for connection in wait(open_connections, timeout=1):
+                try:
+                    connection.recv()
+                except (EOFError, OSError):
+                    open_connections.remove(connection)
+        for process in processes:
+            process.join()
+        for connection in connections:
+            connection.close()
+
+    def _finish_generation(self, generation, reports, connections):
+        islands = range(self.islands)
+        scores = [score for island in islands for score in reports[island][0]]
+        self.truncated = [truncated for island in islands for truncated in reports[island][1]]
+        self.score = max(scores)
+        if self._generation_listener is not None:
+            self._generation_listener.on_generation(generation, scores, self.truncated)
+
+        if reports[0][2] is not None:
+            received = [[] for _ in islands]
+            for island, destination in enumerate(destinations(self.islands, self.topology, self._random)):
+                received[destination].append(reports[island][2])
+            for connection, immigrants in zip(connections, received):
+                connection.send(('immigrants', immigrants))
@@ -1,29 +1,47 @@
 title = 'Self Organizing Network'
 
-buttons = ['START', 'PODGLĄD', 'STOP', 'LINIE', 'NOWY', 'ZAPISZ', 'WCZYTAJ', 'WYJŚCIE']
+buttons = ['START', 'PODGLĄD', 'STOP', 'LINIE', 'NOWY', 'ZAPISZ', 'WCZYTAJ', 'WZNÓW', 'WYJŚCIE']
 
-stats = ['Generacja: ', 'Sieć: ', 'Wynik sieci: ', 'Najlepszy wynik: ', 'Przyciski:']
+stats = ['Generacja: ', 'Sieć: ', 'Wynik sieci: ', 'Najlepszy wynik: ', 'Przerwane oceny: ', 'Przyciski:']
 
 params = ["Rozmiar populacji: ", "Liczba dzieci na generację: ", "Prawdopodobieństwo skrzyżowania: ",
                 "Prawdopodobieństwo mutacji: ", "Liczba ukrytych warstw: ", "Wariancja wag połączeń: "]
 
 frames = ['Statystyki', 'Parametry']
 
+profile_toggle = 'Profilowanie'
+profile_export = 'EKSPORT PROFILU'
+profile_header = 'Profil (średnia / p95 [us]):'
+profile_phases = ['czas', 'wynik', 'połączenia', 'ruch', 'sterowanie', 'rysowanie']
+profile_calls = 'Wywołania na tick: '
+profile_wall_times = ['Epizod [s]: ', 'Generacja [s]: ']
+profile_off = 'Profil: wyłączony'
+
 slider = 'Prędkość symulacji'
 
 create_button = 'UTWÓRZ'
 
+backend = 'Implementacja algorytmu: '
+
 plot_title = ['Najlepszy wynik w generacji', 'Średni wynik generacji']
 plot_xlabel = 'generacja'
 
-msgbox_title = ['Start', 'Zapis', 'Wczytywanie', 'Wyjscie']
+msgbox_title = ['Start', 'Zapis', 'Wczytywanie', 'Wyjscie', 'Profil', 'Wznawianie']
 
 msgbox_msg = ['Należy zdefiniować parametry algorytmu (NOWY/WCZYTAJ)!',
               'Zapis udany!',
               'Zapis nieudany! Należy zdefiniować parametry algorytmu (NOWY/WCZYTAJ)!',
               'Wczytywanie udane!',
               'Plik jest uszkodzony!',
-              'Nie można opuścić programu w trakcie działania symulacji (przycisk STOP)']
+              'Nie można opuścić programu w trakcie działania symulacji (przycisk STOP)',
+              'Profilowanie jest wyłączone!',
+              'Zapis profilu udany!',
+              'Wznowiono z punktu kontrolnego!',
+              'Punkt kontrolny jest uszkodzony!']
 
 mg_filetype = [("Machine Gaming", "*.mg")]
+checkpoint_filetype = [("Punkt kontrolny", "*.pkl.gz")]
 initialfilename = 'algorithm'
+
+profile_filetype = [("JSON", "*.json"), ("CSV", "*.csv")]
+profile_initialfilename = 'profile.json'
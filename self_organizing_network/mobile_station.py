@@ -1,27 +1,20 @@
-import pygame
-import random
-from self_organizing_network.moving_object import MovingObject
+from self_organizing_network.object import Object
 
 
-class MobileStation(MovingObject):
-    def __init__(self, coordinates):
-        image = pygame.image.load('mobile_station.png')
-        v_x = random.uniform(0, 1) - 0.5
-        v_y = random.uniform(0, 1) - 0.5
-        super().__init__(image, coordinates, velocity=(v_x, v_y), image_scale=0.5)
+class MobileStation(Object):
+    def __init__(self, simulation, index):
+        super().__init__('mobile_station.png', direction=0, image_scale=0.5)
 
-        self.power = None
-        self.base_station = None
+        self._simulation = simulation
+        self._index = index
 
+    @property
+    def coordinates(self):
+        return self._simulation.ms_coordinates[self._index]
 
-    def update(self, surface):
-        MovingObject.update(self, surface)
-
-    def connect(self, base_station):
-        self.base_station = base_station
-
-    def disconnect(self):
-        self.base_station = None
+    @property
+    def base_station(self):
+        return self._simulation.ms_base_station[self._index]
 
     def is_connected(self):
-        return self.base_station is not None
\ No newline at end of file
+        return self._simulation.is_connected(self._index)
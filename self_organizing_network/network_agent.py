@@ -0,0 +1,148 @@
+import numpy as np
+import self_organizing_network.topology as topology
+import self_organizing_network.utils as u
+
+
+POWER_RESOLUTION = 100
+
+
+class NetworkAgent:
+    def __init__(self, neural_network, input_size):
+        self.neural_network = neural_network
+        self.input_size = input_size
+        self._observations = ObservationBuilder(input_size)
+
+    def on_tick(self, simulation, base_station):
+        input_vector = self._observations.build(simulation, base_station)
+        output_vector = predict(self.neural_network, input_vector, simulation.profiler)
+        return to_power_change(output_vector)
+
+    def on_synchronous_tick(self, simulation):
+        input_matrix = self._observations.build(simulation)
+        output_matrix = predict_all(self.neural_network, input_matrix, simulation.profiler)
+        return to_power_changes(output_matrix)
+
+
+class ObservationBuilder:
+    """writes the network inputs of a set of base stations into a reused buffer"""
+
+    def __init__(self, input_size):
+        self.input_size = input_size
+        self._buffer = np.zeros((0, input_size))
+
+    def build(self, simulation, base_stations=None):
+        """inputs of one base station as a list, or of a set of them (all by default) as rows of an array"""
+        if base_stations is not None and np.ndim(base_stations) == 0:
+            return self._build_one(simulation, int(base_stations))
+        if base_stations is None:
+            base_stations = np.arange(len(simulation.bs_power))
+        base_stations = np.atleast_1d(base_stations)
+
+        if len(self._buffer) < len(base_stations):
+            self._buffer = np.zeros((len(base_stations), self.input_size))
+        sim_state = self._buffer[:len(base_stations)]
+        return observe(simulation.bs_power, simulation.bs_load, simulation.bs_neighbours, base_stations, sim_state)
+
+    def _build_one(self, simulation, base_station):
+        # one station per tick is the default; a walk over its neighbours beats array calls on a handful of values
+        bs_power = simulation.bs_power
+        bs_load = simulation.bs_load
+        power = float(bs_power[base_station])
+        if power > 1:
+            sim_state = [power / 1000, float(bs_load[base_station])]
+        else:
+            sim_state = [0.0, 0.0]
+
+        for neighbour in simulation.bs_neighbours[base_station].tolist():
+            if neighbour != u.NO_BASE_STATION and bs_power[neighbour] > 1:
+                sim_state.append(float(bs_power[neighbour]) / power)
+                sim_state.append(1.0 if bs_load[neighbour] > 0 else 0.0)
+            else:
+                sim_state.append(0.0)
+                sim_state.append(0.0)
+
+        sim_state += [0.0] * (self.input_size - len(sim_state))
+        return sim_state
+
+
+def observe(bs_power, bs_load, bs_neighbours, base_stations, out):
+    """network inputs of base_stations written into out; bs_power, bs_load and base_stations may carry
+    leading episode dimensions, out then has them too"""
+    power = _gather(bs_power, base_stations)
+    on = power > 1
+    np.multiply(on, power / 1000, out=out[..., 0])
+    np.multiply(on, _gather(bs_load, base_stations), out=out[..., 1])
+
+    neighbours = bs_neighbours[base_stations]
+    present = neighbours != u.NO_BASE_STATION
+    neighbours = np.where(present, neighbours, 0)
+    neighbour_power = _gather(bs_power, neighbours)
+    present &= neighbour_power > 1
+
+    features_end = 2 + 2 * topology.NEIGHBOURS
+    np.multiply(present, neighbour_power / power[..., np.newaxis], out=out[..., 2:features_end:2])
+    np.logical_and(present, _gather(bs_load, neighbours) > 0, out=out[..., 3:features_end:2],
+                   casting='unsafe')
+    out[..., features_end:] = 0
+    return out
+
+
+def _gather(values, indices):
+    """values[..., indices] taken separately for every leading index of values"""
+    if values.ndim == 1:
+        # an engine's arrays: plain indexing costs a fraction of take_along_axis
+        return values[indices]
+    flat = indices.reshape(values.shape[:-1] + (-1,))
+    return np.take_along_axis(values, flat, axis=-1).reshape(indices.shape)
+
+
+def predict(neural_network, input_vector, profiler=None):
+    neural_network.feed_forward(input_vector)
+    output_vector = neural_network.get_output()
+    if profiler is not None:
+        profiler.count('pyvolution', 2)
+
+    for i in range(len(output_vector)):
+        output_vector[i] = round(output_vector[i], 3)
+
+    return output_vector
+
+
+def to_power_change(output_vector):
+    action = max(output_vector)
+    if output_vector.count(action) == 1:
+        action_index = output_vector.index(action)
+        if action_index == 0:
+            return action * POWER_RESOLUTION
+        elif action_index == 1:
+            return 0
+        elif action_index == 2:
+            return - action * POWER_RESOLUTION
+    return 0
+
+
+def predict_all(neural_network, input_matrix, profiler=None):
+    if hasattr(neural_network, 'feed_forward_all'):
+        output_matrix = np.asarray(neural_network.feed_forward_all(input_matrix), dtype=np.float64)
+        calls = 1
+    else:
+        output_matrix = np.array([_forward(neural_network, input_vector) for input_vector in input_matrix.tolist()],
+                                 dtype=np.float64)
+        calls = 2 * len(input_matrix)
+    if profiler is not None:
+        profiler.count('pyvolution', calls)
+    return np.round(output_matrix, 3)
+
+
+def _forward(neural_network, input_vector):
+    neural_network.feed_forward(input_vector)
+    return neural_network.get_output()
+
+
+def to_power_changes(output_matrix):
+    action = output_matrix.max(axis=1)
+    action_index = output_matrix.argmax(axis=1)
+    unique = np.count_nonzero(output_matrix == action[:, np.newaxis], axis=1) == 1
+
+    direction = np.select([action_index == 0, action_index == 2], [1, -1], 0)
+    return np.where(unique, direction * action * POWER_RESOLUTION, 0)
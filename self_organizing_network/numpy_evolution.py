@@ -0,0 +1,248 @@
+import hashlib
+import json
+
+import numpy as np
+
+
+class EvolutionaryAlgorithmParameters:
+    """the fields of pyvolution.EvolutionaryAlgorithmParameters"""
+    population_size = 10
+    children_bred_per_generation = 4
+    crossover_probability = 1.0
+    mutation_probability = 0.5
+    hidden_layers = 3
+    input_size = 14
+    output_size = 3
+    weight_variance = 10.0
+
+
+def _sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1)
+
+
+class Population:
+    """weights of every network stacked along the first axis: weights[layer] is (population, inputs, outputs)"""
+
+    def __init__(self, weights, biases, fitness):
+        self.weights = weights
+        self.biases = biases
+        self.fitness = fitness
+
+    def __len__(self):
+        return len(self.fitness)
+
+    def feed_forward(self, index, input_matrix):
+        output = np.asarray(input_matrix, dtype=np.float64)
+        for weights, biases in zip(self.weights, self.biases):
+            output = _sigmoid(output @ weights[index] + biases[index])
+        return output
+
+    def feed_forward_population(self, indices, input_matrix):
+        """outputs of the rows of input_matrix, each fed to the network at the same position of indices,
+        in one batched pass"""
+        output = np.asarray(input_matrix, dtype=np.float64)[:, np.newaxis, :]
+        for weights, biases in zip(self.weights, self.biases):
+            output = _sigmoid(np.matmul(output, weights[indices]) + biases[indices][:, np.newaxis, :])
+        return output[:, 0, :]
+
+    def tensors(self):
+        return self.weights + self.biases
+
+    def replace(self, indices, tensors):
+        for tensor, children in zip(self.tensors(), tensors):
+            tensor[indices] = children
+
+
+def random_population(layer_sizes, population_size, weight_variance, random):
+    deviation = np.sqrt(weight_variance)
+    weights = [random.normal(0, deviation, (population_size, inputs, outputs))
+               for inputs, outputs in zip(layer_sizes[:-1], layer_sizes[1:])]
+    biases = [random.normal(0, deviation, (population_size, outputs)) for outputs in layer_sizes[1:]]
+    return Population(weights, biases, np.zeros(population_size))
+
+
+class NeuralNetwork:
+    """one network of a Population, with the interface of a pyvolution network"""
+
+    def __init__(self, population, index):
+        self._population = population
+        self._index = index
+        self._output = []
+
+    @property
+    def fitness(self):
+        return float(self._population.fitness[self._index])
+
+    @fitness.setter
+    def fitness(self, value):
+        self._population.fitness[self._index] = value
+
+    def feed_forward(self, input_vector):
+        self._output = self._population.feed_forward(self._index, input_vector).tolist()
+
+    def get_output(self):
+        return list(self._output)
+
+    def feed_forward_all(self, input_matrix):
+        return self._population.feed_forward(self._index, input_matrix)
+
+    def detached(self):
+        """a copy holding only this network's weights, small enough to send to another process"""
+        index = slice(self._index, self._index + 1)
+        population = self._population
+        return NeuralNetwork(Population([weights[index].copy() for weights in population.weights],
+                                        [biases[index].copy() for biases in population.biases],
+                                        population.fitness[index].copy()), 0)
+
+    def fingerprint(self):
+        digest = hashlib.sha256()
+        for tensor in self._population.tensors():
+            digest.update(tensor[self._index].tobytes())
+        return digest.hexdigest()
+
+
+def feed_forward_rows(networks, input_matrix):
+    """outputs of the rows of input_matrix, row i fed to networks[i]; the networks of one population
+    share a single pass"""
+    input_matrix = np.asarray(input_matrix, dtype=np.float64)
+    groups = {}
+    for row, neural_network in enumerate(networks):
+        population = neural_network._population
+        group = groups.setdefault(id(population), (population, [], []))
+        group[1].append(row)
+        group[2].append(neural_network._index)
+
+    output = None
+    for population, rows, indices in groups.values():
+        outputs = population.feed_forward_population(np.array(indices), input_matrix[rows])
+        if output is None:
+            output = np.empty((len(input_matrix), outputs.shape[1]))
+        output[rows] = outputs
+    return output
+
+
+class EvolutionaryAlgorithm:
+    """steady-state algorithm: every generation the worst networks are replaced by bred children"""
+
+    def __init__(self, parameters=None, seed=None):
+        self.random = np.random.default_rng(seed)
+        self.population = None
+        self.generation = 1
+        self.current = 0
+        self._parameters = {}
+        if parameters is not None:
+            self._parameters = {name: getattr(parameters, name) for name in vars(EvolutionaryAlgorithmParameters)
+                                if not name.startswith('_')}
+            self.population = random_population(self._layer_sizes(), self.get_population_size(),
+                                                self.get_weight_variance(), self.random)
+
+    def _layer_sizes(self):
+        # hidden layers are as wide as the input
+        p = self._parameters
+        return [p['input_size']] * (p['hidden_layers'] + 1) + [p['output_size']]
+
+    def get_next(self):
+        if self.current == self.get_population_size():
+            self._breed()
+            self.generation += 1
+            self.current = 0
+        self.current += 1
+        return NeuralNetwork(self.population, self.current - 1)
+
+    def get_current_network(self):
+        return self.current
+
+    def get_current_generation(self):
+        return self.generation
+
+    def get_population_size(self):
+        return int(self._parameters['population_size'])
+
+    def get_children_bred_per_generation(self):
+        return int(self._parameters['children_bred_per_generation'])
+
+    def get_crossover_probability(self):
+        return float(self._parameters['crossover_probability'])
+
+    def get_mutation_probability(self):
+        return float(self._parameters['mutation_probability'])
+
+    def get_hidden_layers(self):
+        return int(self._parameters['hidden_layers'])
+
+    def get_weight_variance(self):
+        return float(self._parameters['weight_variance'])
+
+    def _breed(self):
+        fitness = self.population.fitness
+        children = min(self.get_children_bred_per_generation(), len(fitness))
+        if children == 0:
+            return
+
+        # binary tournaments for both parents of every child at once
+        contestants = self.random.integers(0, len(fitness), (2, children, 2))
+        winners = np.where(fitness[contestants[:, :, 0]] >= fitness[contestants[:, :, 1]],
+                           contestants[:, :, 0], contestants[:, :, 1])
+        crossed = self.random.random(children) < self.get_crossover_probability()
+
+        offspring = []
+        for tensor in self.population.tensors():
+            first = tensor[winners[0]]
+            second = tensor[winners[1]]
+            gene_shape = (children,) + (1,) * (tensor.ndim - 1)
+            from_second = (self.random.random(first.shape) < 0.5) & crossed.reshape(gene_shape)
+            child = np.where(from_second, second, first)
+
+            mutated = self.random.random(child.shape) < self.get_mutation_probability()
+            child += mutated * self.random.normal(0, np.sqrt(self.get_weight_variance()), child.shape)
+            offspring.append(child)
+
+        worst = np.argsort(fitness, kind='stable')[:children]
+        self.population.replace(worst, offspring)
+        self.population.fitness[worst] = 0
+
+    def emigrants(self, count):
+        """copies of the tensors and fitness of the best count networks"""
+        best = np.argsort(-self.population.fitness, kind='stable')[:count]
+        return [tensor[best].copy() for tensor in self.population.tensors()], self.population.fitness[best].copy()
+
+    def immigrate(self, tensors, fitness):
+        """replaces the worst networks by immigrants, which keep their fitness from home until evaluated here"""
+        count = min(len(fitness), len(self.population))
+        worst = np.argsort(self.population.fitness, kind='stable')[:count]
+        self.population.replace(worst, [tensor[:count] for tensor in tensors])
+        self.population.fitness[worst] = fitness[:count]
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            np.savez_compressed(file, **self._state())
+
+    def load(self, path):
+        with open(path, 'rb') as file, np.load(file) as state:
+            self._restore({name: state[name] for name in state.files})
+
+    def snapshot(self):
+        """copies of the arrays save writes, to be compressed later, e.g. by a checkpoint writer"""
+        return {name: array.copy() for name, array in self._state().items()}
+
+    def _state(self):
+        state = {'meta': np.array(json.dumps({'parameters': self._parameters,
+                                              'generation': self.generation,
+                                              'current': self.current,
+                                              'random': self.random.bit_generator.state})),
+                 'fitness': self.population.fitness}
+        for i, tensor in enumerate(self.population.tensors()):
+            state['tensor_%d' % i] = tensor
+        return state
+
+    def _restore(self, state):
+        meta = json.loads(str(state['meta']))
+        self._parameters = meta['parameters']
+        self.generation = meta['generation']
+        self.current = meta['current']
+        self.random.bit_generator.state = meta['random']
+
+        layers = len(self._layer_sizes()) - 1
+        self.population = Population([state['tensor_%d' % i] for i in range(layers)],
+                                     [state['tensor_%d' % i] for i in range(layers, 2 * layers)],
+                                     state['fitness'])
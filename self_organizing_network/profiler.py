@@ -0,0 +1,114 @@
+import collections
+import csv
+import json
+import time
+
+import numpy as np
+import self_organizing_network.utils as u
+
+
+PHASES = ['time', 'score', 'connections', 'move', 'tick', 'render']
+
+# log-spaced histogram bins from 0.1 us to 1 s
+HISTOGRAM_EDGES_US = np.logspace(-1, 6, 29)
+
+
+class TickProfiler:
+    """rolling timings of the last window ticks per phase, call counters per tick and wall times"""
+
+    def __init__(self, window=u.PROFILER_WINDOW):
+        self.window = window
+        self.ticks = 0
+        self._timings = {phase: np.zeros(window) for phase in PHASES}
+        self._recorded = dict.fromkeys(PHASES, 0)
+        self._counts = {}
+        self._tick_counts = {}
+        self._episode_times = collections.deque(maxlen=window)
+        self._generation_times = collections.deque(maxlen=window)
+        self._episode_start = None
+        self._generation_start = None
+
+    def record(self, phase, seconds):
+        self._timings[phase][self._recorded[phase] % self.window] = seconds
+        self._recorded[phase] += 1
+
+    def count(self, name, calls=1):
+        self._tick_counts[name] = self._tick_counts.get(name, 0) + calls
+
+    def end_tick(self):
+        row = self.ticks % self.window
+        for name in self._tick_counts:
+            if name not in self._counts:
+                self._counts[name] = np.zeros(self.window)
+        for name, counts in self._counts.items():
+            counts[row] = self._tick_counts.get(name, 0)
+        self._tick_counts = {}
+        self.ticks += 1
+
+    def start_episode(self):
+        self._episode_start = time.perf_counter()
+
+    def finish_episode(self):
+        if self._episode_start is not None:
+            self._episode_times.append(time.perf_counter() - self._episode_start)
+            self._episode_start = None
+
+    def start_generation(self):
+        self._generation_start = time.perf_counter()
+
+    def finish_generation(self):
+        if self._generation_start is not None:
+            self._generation_times.append(time.perf_counter() - self._generation_start)
+            self._generation_start = None
+
+    def summary(self):
+        phases = {}
+        for phase in PHASES:
+            samples = self._timings[phase][:min(self._recorded[phase], self.window)] * 1e6
+            if len(samples) == 0:
+                continue
+            phases[phase] = {'mean_us': float(samples.mean()),
+                             'p50_us': float(np.percentile(samples, 50)),
+                             'p95_us': float(np.percentile(samples, 95)),
+                             'max_us': float(samples.max()),
+                             'histogram': np.histogram(samples, HISTOGRAM_EDGES_US)[0].tolist()}
+
+        ticks = min(self.ticks, self.window)
+        calls = {name: float(counts[:ticks].mean()) if ticks else 0.0 for name, counts in self._counts.items()}
+
+        return {'ticks': self.ticks,
+                'phases': phases,
+                'calls_per_tick': calls,
+                'episode_s': _wall_times(self._episode_times),
+                'generation_s': _wall_times(self._generation_times),
+                'histogram_edges_us': HISTOGRAM_EDGES_US.tolist()}
+
+    def dump(self, path):
+        """writes the summary as CSV if the path ends with .csv, as JSON otherwise"""
+        summary = self.summary()
+        if not path.lower().endswith('.csv'):
+            with open(path, 'w') as file:
+                json.dump(summary, file, indent=1)
+            return
+
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['section', 'name', 'statistic', 'value'])
+            writer.writerow(['ticks', '', 'count', summary['ticks']])
+            for phase, statistics in summary['phases'].items():
+                for statistic, value in statistics.items():
+                    if statistic != 'histogram':
+                        writer.writerow(['phase', phase, statistic, value])
+                for edge, count in zip(summary['histogram_edges_us'], statistics['histogram']):
+                    writer.writerow(['histogram', phase, edge, count])
+            for name, value in summary['calls_per_tick'].items():
+                writer.writerow(['calls_per_tick', name, 'mean', value])
+            for section in ['episode_s', 'generation_s']:
+                for statistic, value in summary[section].items():
+                    writer.writerow([section, '', statistic, value])
+
+
+def _wall_times(times):
+    if not times:
+        return {'count': 0}
+    return {'count': len(times), 'mean': float(np.mean(times)), 'last': times[-1]}
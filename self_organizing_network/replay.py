@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import self_organizing_network.utils as u
+from self_organizing_network.episode_trace import Trace, META_FILE
+from self_organizing_network.simulation_engine import move
+
+
+class ReplaySimulation:
+    """plays a recorded episode back through the SimulationEngine interface the views read"""
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.size = trace.meta['size']
+        self.ms_count = trace.meta['ms_count']
+        self.running = False
+        self.profiler = None  # SimulationWindow times the engine's phases, a replay has none
+        self.reset()
+
+    def reset(self):
+        self.tick = 0
+        self.time_elapsed = 0
+        self.score = 0
+        self.times_disconnected = 0
+        self.bs_coordinates = self.trace.initial['bs_coordinates']
+        self.bs_power = self.trace.initial['bs_power'].copy()
+        self.ms_coordinates = self.trace.initial['ms_coordinates'].copy()
+        self.ms_velocity = self.trace.initial['ms_velocity'].copy()
+        self.ms_base_station = np.full(self.ms_count, u.NO_BASE_STATION, dtype=np.int64)
+
+    def run(self):
+        self.running = True
+        self.reset()
+        while self.running and self.tick < self.trace.ticks:
+            self.step()
+
+    def close(self):
+        """a trace is only read, there is nothing to write out"""
+
+    def step(self):
+        if self.tick >= self.trace.ticks:
+            return
+        # assignments are recorded after the connection phase, which comes before the move
+        self.ms_base_station = self.trace['assignment'][self.tick].astype(np.int64)
+        self.ms_coordinates = move(self.ms_coordinates, self.ms_velocity, self.size)
+        self.bs_power = self.trace['power'][self.tick].astype(np.float64)
+        self.score += float(self.trace['score_delta'][self.tick])
+        self.times_disconnected = int(self.trace['times_disconnected'][self.tick])
+        self.time_elapsed += 1
+        self.tick += 1
+
+    def get_power(self, bs):
+        return float(self.bs_power[bs])
+
+    def is_connected(self, ms):
+        return self.ms_base_station[ms] != u.NO_BASE_STATION
+
+
+def summarise(trace):
+    scores = trace.scores()
+    assignment = trace['assignment']
+    power_change = trace['power_change']
+    return {'episode': trace.meta['episode'],
+            'seed': trace.meta['seed'],
+            'ticks': trace.ticks,
+            'score': float(scores[-1]) if trace.ticks else 0.0,
+            'min_score': float(scores.min()) if trace.ticks else 0.0,
+            'max_score': float(scores.max()) if trace.ticks else 0.0,
+            'times_disconnected': int(trace['times_disconnected'][-1]) if trace.ticks else 0,
+            'connected_ratio': float(np.mean(assignment != u.NO_BASE_STATION)) if trace.ticks else 0.0,
+            'mean_power': float(np.mean(trace['power'])) if trace.ticks else 0.0,
+            'power_increases': int(np.count_nonzero(power_change > 0)),
+            'power_decreases': int(np.count_nonzero(power_change < 0))}
+
+
+def find_traces(path):
+    if os.path.exists(os.path.join(path, META_FILE)):
+        return [path]
+    return [os.path.join(path, name) for name in sorted(os.listdir(path))
+            if os.path.exists(os.path.join(path, name, META_FILE))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyse or re-render recorded episodes.')
+    parser.add_argument('path', help='episode trace directory or a directory of them')
+    parser.add_argument('--render', action='store_true', help='play the episodes back in a window')
+    parser.add_argument('--speed', type=float, default=u.DEFAULT_SPEED)
+    args = parser.parse_args()
+
+    for path in find_traces(args.path):
+        trace = Trace(path)
+        print(json.dumps(summarise(trace)))
+        if args.render:
+            from self_organizing_network.simulation_window import SimulationWindow
+            window = SimulationWindow(simulation=ReplaySimulation(trace))
+            window.speed = args.speed
+            window.run()
+
+
+if __name__ == '__main__':
+    main()
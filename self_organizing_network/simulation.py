@@ -1,5 +1,4 @@
-from self_organizing_network.simulation_window import SimulationWindow
-
 if __name__ == "__main__":
+    from self_organizing_network.simulation_window import SimulationWindow
     simulation = SimulationWindow()
     simulation.run()
@@ -1,20 +1,64 @@
 import threading
-from self_organizing_network.simulation_window import SimulationWindow
+import self_organizing_network.utils as u
+import self_organizing_network.network_agent as network_agent
+from self_organizing_network.episode_trace import TraceRecorder
+from self_organizing_network.evaluation import BatchedEvaluator, GenerationRunner
+from self_organizing_network.islands import IslandModel
+from self_organizing_network.profiler import TickProfiler
+from self_organizing_network.simulation_engine import SimulationEngine
 
 
 class SimulationController:
-    def __init__(self, stats_window, key_threshold=0.75):
+    def __init__(self, stats_window, ea_controller=None, workers=u.EVALUATION_WORKERS, seed=None,
+                 key_threshold=0.75):
         self.stats_window = stats_window
+        self.ea_controller = ea_controller
+        self.workers = workers
+        self.seed = seed
+        self.profiler = None
+        self.record_directory = None  # episodes are recorded under it when set
         self.current = None
         self.current_game_thread = None
 
     def start(self, headless):
-        self.current = SimulationWindow(finish_listener=self.stats_window,
-                                        tick_listener=self.stats_window,
-                                        headless=headless)
+        if self.record_directory is not None and headless and self.ea_controller is not None and u.ISLANDS > 1:
+            raise ValueError('island runs cannot be recorded')
+        if headless and self.ea_controller is not None and u.ISLANDS > 1:
+            # the islands breed populations of their own, ea_controller only provides the parameters
+            self.current = IslandModel(parameters=self.ea_controller.get_parameters(),
+                                       generation_listener=self.stats_window,
+                                       workers=max(self.workers // u.ISLANDS, 1),
+                                       seed=self.seed)
+        elif headless and self.ea_controller is not None and (self.workers > 1 or u.BATCHED_EVALUATION):
+            evaluator = BatchedEvaluator(workers=self.workers) if u.BATCHED_EVALUATION else None
+            self.current = GenerationRunner(ea_controller=self.ea_controller,
+                                            generation_listener=self.stats_window,
+                                            workers=self.workers,
+                                            seed=self.seed,
+                                            evaluator=evaluator,
+                                            record_directory=self.record_directory)
+            self.current.profiler = self.profiler
+        elif headless:
+            # no window, no frame pacing and no drawing: the engine runs as fast as it can
+            self.current = SimulationEngine(finish_listener=self.stats_window,
+                                            tick_listener=self.stats_window,
+                                            seed=self.seed,
+                                            recorder=self._recorder(),
+                                            profiler=self.profiler)
+        else:
+            # pygame is only imported once a preview is actually opened
+            from self_organizing_network.simulation_window import SimulationWindow
+            self.current = SimulationWindow(simulation=SimulationEngine(finish_listener=self.stats_window,
+                                                                        tick_listener=self.stats_window,
+                                                                        seed=self.seed,
+                                                                        recorder=self._recorder(),
+                                                                        profiler=self.profiler))
         self.current_game_thread = threading.Thread(target=self.current.run)
         self.current_game_thread.start()
 
+    def _recorder(self):
+        return TraceRecorder(self.record_directory) if self.record_directory is not None else None
+
     def stop(self):
         if self.current is not None:
             self.current.running = False
@@ -22,6 +66,14 @@ class SimulationController:
         if self.current_game_thread is not None:
             self.current_game_thread.join(5)
 
+    def set_profiling(self, enabled):
+        """switches the tick profiler on or off, also for the run in progress"""
+        self.profiler = TickProfiler() if enabled else None
+        if self.ea_controller is not None:
+            self.ea_controller.profiler = self.profiler
+        if self.current is not None:
+            getattr(self.current, 'simulation', self.current).profiler = self.profiler
+
     def change_speed(self, speed):
         if self.current is not None:
             self.current.speed = float(speed)
@@ -30,8 +82,8 @@ class SimulationController:
         if self.current is not None:
             self.current.display_connections = not self.current.display_connections
 
-    def predict_power_change(self, neural_network, input_vector):
-        neural_network.feed_forward(input_vector)
-        output_vector = neural_network.get_output()
+    def predict_power_change(self, neural_network, input_vector, profiler=None):
+        return network_agent.predict(neural_network, input_vector, profiler)
 
-        return output_vector
+    def predict_power_changes(self, neural_network, input_matrix, profiler=None):
+        return network_agent.predict_all(neural_network, input_matrix, profiler)
@@ -0,0 +1,371 @@
+import math
+import random
+import time
+
+import numpy as np
+import self_organizing_network.topology as topology
+import self_organizing_network.utils as u
+from self_organizing_network.spatial_index import SpatialIndex
+
+
+FOUR_PI = 4 * math.pi
+
+
+class SimulationEngine:
+    def __init__(self, finish_listener=None, tick_listener=None,
+                 rows=u.DEFAULT_ROWS, cols=u.DEFAULT_COLS, ms_count=u.DEFAULT_MS,
+                 synchronous=u.SYNCHRONOUS_CONTROL, size=u.WINDOW_SIZE, spatial_index=None,
+                 seed=None, recorder=None, profiler=None):
+        self._finish_listener = finish_listener
+        self._tick_listener = tick_listener
+        self._recorder = recorder
+        self.profiler = profiler
+        self.synchronous = synchronous
+        self.size = size
+        self.use_spatial_index = spatial_index
+        self._spatial_index = None
+        self.rows = rows
+        self.cols = cols
+        self.ms_count = ms_count
+
+        # without a seed every stream is the global random module, as before seeding existed
+        self.seed = seed
+        self.episode = -1
+        self._mobility_random = random
+        self._power_random = random
+        self._action_random = random
+
+        self.time_elapsed = 0
+        self.score = 0
+        self.times_disconnected = 0
+        self.running = False
+        # score an episode has to be able to reach to be run to the end, see _race
+        self.racing_bound = None
+        self.truncated = False
+        # a finished episode is replaced by the next one only when the engine steps again, so that a
+        # finish listener stopping the run does not leave a fresh, never played episode behind
+        self._ended = False
+
+        self.bs_coordinates = np.empty((0, 2))
+        self.bs_power = np.empty(0)
+        self.bs_off = np.empty(0, dtype=bool)
+        self.bs_load = np.empty(0, dtype=np.int64)
+        self.bs_neighbours = np.empty((0, topology.NEIGHBOURS), dtype=np.int64)
+
+        self.ms_coordinates = np.empty((0, 2))
+        self.ms_velocity = np.empty((0, 2))
+        self.ms_base_station = np.empty(0, dtype=np.int64)
+        self.ms_power = np.empty(0)
+        self.action_station = u.NO_BASE_STATION
+        self.power_change = 0
+
+        # running aggregates kept up to date by the power and connection setters
+        self._power_sum = 0.0
+        self._saturated_count = 0
+        self._connected_count = 0
+
+    def reset(self):
+        self.episode += 1
+        self._seed_streams()
+        self.time_elapsed = 0
+        self.score = 0
+        self.times_disconnected = 0
+        self.truncated = False
+        self._ended = False
+        self._add_base_stations(self.rows, self.cols)
+        self._add_mobile_stations(self.ms_count)
+        if self._recorder is not None:
+            self._recorder.on_reset(self)
+        if self.profiler is not None:
+            self.profiler.start_episode()
+
+    def _seed_streams(self):
+        if self.seed is not None:
+            self._mobility_random = random.Random(u.derive_seed(self.seed, self.episode, 'mobility'))
+            self._power_random = random.Random(u.derive_seed(self.seed, self.episode, 'power'))
+            self._action_random = random.Random(u.derive_seed(self.seed, self.episode, 'action'))
+
+    def _add_base_stations(self, rows, cols):
+        self.bs_coordinates = topology.hex_coordinates(rows, cols, self.size)
+        self.bs_neighbours = topology.hex_neighbours(rows, cols)
+
+        count = len(self.bs_coordinates)
+        power_variance = int(u.DEFAULT_BASE_STATION_POWER / 10)
+        self.bs_power = np.array([u.DEFAULT_BASE_STATION_POWER + self._power_random.randrange(-power_variance, power_variance)
+                                  for _ in range(count)], dtype=np.float64)
+        self.bs_off = np.zeros(count, dtype=bool)
+        self.bs_load = np.zeros(count, dtype=np.int64)
+        self._power_sum = float(np.sum(self.bs_power))
+        self._saturated_count = int(np.count_nonzero(self._is_saturated(self.bs_power)))
+
+        use_spatial_index = self.use_spatial_index
+        if use_spatial_index is None:
+            use_spatial_index = count >= u.SPATIAL_INDEX_MIN_BASE_STATIONS
+        if use_spatial_index:
+            self._spatial_index = SpatialIndex(self.bs_coordinates, self.bs_power, self.size)
+        else:
+            self._spatial_index = None
+
+    def _add_mobile_stations(self, num):
+        velocity = []
+        for _ in range(num):
+            v_x = self._mobility_random.uniform(0, 1) - 0.5
+            v_y = self._mobility_random.uniform(0, 1) - 0.5
+            velocity.append((v_x, v_y))
+
+        self.ms_coordinates = np.full((num, 2), self.size / 2, dtype=np.float64)
+        self.ms_velocity = np.array(velocity, dtype=np.float64).reshape(num, 2)
+        self.ms_base_station = np.full(num, u.NO_BASE_STATION, dtype=np.int64)
+        self.ms_power = np.full(num, np.nan)
+        self._connected_count = 0
+
+    def run(self):
+        self.running = True
+        self.reset()
+        try:
+            while self.running:
+                self.step()
+        finally:
+            self.close()
+
+    def close(self):
+        """writes out what the recorder still buffers; for callers that step the engine themselves"""
+        if self._recorder is not None:
+            self._recorder.close()
+
+    def step(self):
+        if self._ended:
+            self.reset()
+        if self.profiler is not None:
+            self._profiled_step()
+            return
+
+        self._refresh_time()
+        self._refresh_score()
+        if self._ended:
+            return
+        self._refresh_connections()
+        self._move_mobile_stations()
+        self._tick()
+        self._end_step()
+
+    def _profiled_step(self):
+        profiler = self.profiler
+        for phase, refresh in (('time', self._refresh_time),
+                               ('score', self._refresh_score),
+                               ('connections', self._refresh_connections),
+                               ('move', self._move_mobile_stations),
+                               ('tick', self._tick)):
+            start = time.perf_counter()
+            refresh()
+            profiler.record(phase, time.perf_counter() - start)
+            if self._ended:
+                break
+        if not self._ended:
+            self._end_step()
+        profiler.end_tick()
+
+    def _end_step(self):
+        if self._recorder is not None:
+            self._recorder.on_tick(self)
+
+        if self.time_elapsed == u.DEFAULT_DURATION or self.times_disconnected > u.DISCONNECTED_TOLERANCE:
+            self._finish()
+
+    def _refresh_time(self):
+        self.time_elapsed += 1
+
+    def _refresh_score(self):
+        if self.ms_count == 0:
+            return
+        if self._saturated_count > 0:
+            self._finish()
+            return
+
+        modifier = self._power_sum / len(self.bs_power)
+        disconnected = self.ms_count - self._connected_count
+        self.score += (self._connected_count - disconnected) / modifier
+
+        if self.racing_bound is not None and self.time_elapsed % u.RACING_INTERVAL == 0:
+            self._race(modifier)
+
+    def _race(self, modifier):
+        """ends the episode if it could not reach racing_bound even with every mobile station
+        connected at the current power for the rest of it. A heuristic, not a bound: lowering the
+        power raises the score per tick, so a cut episode could still have made it"""
+        best_case = self.score + (u.DEFAULT_DURATION - self.time_elapsed) * self.ms_count / modifier
+        if best_case < self.racing_bound:
+            self.truncated = True
+            self._finish()
+
+    def _refresh_connections(self):
+        best, power = self._find_best_base_stations()
+        self.ms_power = power
+
+        changed = np.flatnonzero(best != self.ms_base_station)
+        if changed.size == 0:
+            return
+
+        previous = self.ms_base_station[changed]
+        requested = best[changed]
+        self.times_disconnected += int(np.count_nonzero(requested == u.NO_BASE_STATION))
+
+        joining = requested[requested != u.NO_BASE_STATION]
+        joins = np.bincount(joining, minlength=len(self.bs_load))
+        # a join is refused only if the station is full when its turn comes; the k-th join
+        # to a station sees at most load + k mobiles, so below this bound order does not matter
+        if np.all(self.bs_load + joins - 1 < u.MAX_BS_CAPACITY):
+            leaving = previous[previous != u.NO_BASE_STATION]
+            self.bs_load -= np.bincount(leaving, minlength=len(self.bs_load))
+            self.bs_load += joins
+            self.ms_base_station[changed] = requested
+            self._connected_count += len(joining) - len(leaving)
+        else:
+            self._admit_in_order(changed, requested)
+
+    def _admit_in_order(self, changed, requested):
+        for ms, bs in zip(changed.tolist(), requested.tolist()):
+            self.disconnect(ms)
+            if bs != u.NO_BASE_STATION and self.has_free_channels(bs):
+                self.connect(ms, bs)
+
+    def _find_best_base_stations(self):
+        if self._spatial_index is not None:
+            candidates = self._spatial_index.candidates(self.ms_coordinates)
+            density = self._calculate_candidate_power_density(candidates)
+            column = np.argmax(density, axis=1)
+            rows = np.arange(len(column))
+            best = candidates[rows, column]
+            max_power_density = density[rows, column]
+        else:
+            density = self.calculate_power_density(self.ms_coordinates)
+            best = np.argmax(density, axis=1)
+            max_power_density = density[np.arange(len(best)), best]
+
+        in_range = max_power_density > u.POWER_DENSITY_THRESHOLD
+        best = np.where(in_range, best, u.NO_BASE_STATION)
+        power = np.where(in_range, max_power_density, np.nan)
+        return best, power
+
+    def calculate_power_density(self, coordinates):
+        d_x = self.bs_coordinates[:, 0] - coordinates[:, 0, np.newaxis]
+        d_y = self.bs_coordinates[:, 1] - coordinates[:, 1, np.newaxis]
+        distance_square = d_x ** 2 + d_y ** 2
+
+        density = np.broadcast_to(self.bs_power, distance_square.shape).copy()
+        np.divide(self.bs_power, FOUR_PI * distance_square, out=density, where=distance_square != 0)
+        return density
+
+    def _calculate_candidate_power_density(self, candidates):
+        valid = candidates != u.NO_BASE_STATION
+        candidates = np.where(valid, candidates, 0)
+        d_x = self.bs_coordinates[candidates, 0] - self.ms_coordinates[:, 0, np.newaxis]
+        d_y = self.bs_coordinates[candidates, 1] - self.ms_coordinates[:, 1, np.newaxis]
+        distance_square = d_x ** 2 + d_y ** 2
+
+        power = self.bs_power[candidates]
+        density = power.copy()
+        np.divide(power, FOUR_PI * distance_square, out=density, where=distance_square != 0)
+        density[~valid] = -np.inf
+        return density
+
+    def _move_mobile_stations(self):
+        self.ms_coordinates = move(self.ms_coordinates, self.ms_velocity, self.size)
+
+    def _tick(self):
+        self.action_station = u.NO_BASE_STATION
+        self.power_change = 0
+        if self._tick_listener is None:
+            return
+        if self.profiler is not None:
+            self.profiler.count('listener')
+        if self.synchronous:
+            self.power_change = self._tick_listener.on_synchronous_tick(self)
+            self.change_powers_by(self.power_change)
+        else:
+            self.action_station = self._action_random.randrange(0, len(self.bs_power))
+            self.power_change = self._tick_listener.on_tick(self, self.action_station)
+            self.change_power_by(self.action_station, self.power_change)
+
+    def _finish(self):
+        self._ended = True
+        if self.profiler is not None:
+            self.profiler.finish_episode()
+        if self._finish_listener is not None:
+            self._finish_listener.on_finish()
+
+    def connect(self, ms, bs):
+        self.ms_base_station[ms] = bs
+        self.bs_load[bs] += 1
+        self._connected_count += 1
+
+    def disconnect(self, ms):
+        bs = self.ms_base_station[ms]
+        if bs != u.NO_BASE_STATION:
+            self.bs_load[bs] -= 1
+            self.ms_base_station[ms] = u.NO_BASE_STATION
+            self._connected_count -= 1
+
+    def is_connected(self, ms):
+        return self.ms_base_station[ms] != u.NO_BASE_STATION
+
+    def change_power_by(self, bs, power_change):
+        power = self.bs_power[bs]
+        if not self.bs_off[bs]:
+            power += power_change
+        self._set_power(bs, min(max(power, 1), u.MAX_BASE_STATION_POWER))
+
+    def change_powers_by(self, power_changes):
+        power = np.where(self.bs_off, self.bs_power, self.bs_power + power_changes)
+        np.clip(power, 1, u.MAX_BASE_STATION_POWER, out=power)
+
+        changed = np.flatnonzero(power != self.bs_power)
+        previous = self.bs_power[changed]
+        current = power[changed]
+        self._power_sum += float(np.sum(current - previous))
+        self._saturated_count += int(np.count_nonzero(self._is_saturated(current))
+                                     - np.count_nonzero(self._is_saturated(previous)))
+        self.bs_power[changed] = current
+        self._update_spatial_index(changed)
+
+    def _set_power(self, bs, power):
+        previous = self.bs_power[bs]
+        self._power_sum += float(power - previous)
+        self._saturated_count += int(self._is_saturated(power)) - int(self._is_saturated(previous))
+        self.bs_power[bs] = power
+        self._update_spatial_index(bs)
+
+    @staticmethod
+    def _is_saturated(power):
+        return (power == u.MAX_BASE_STATION_POWER) | (power == 1)
+
+    def _update_spatial_index(self, base_stations):
+        if self._spatial_index is not None:
+            self._spatial_index.update(base_stations, self.bs_power)
+
+    def get_power(self, bs):
+        return float(self.bs_power[bs])
+
+    def get_load(self, bs):
+        return int(self.bs_load[bs])
+
+    def get_neighbours(self, bs):
+        return self.bs_neighbours[bs]
+
+    def is_on(self, bs):
+        return self.bs_power[bs] > 1
+
+    def turn_off(self, bs):
+        self.bs_off[bs] = True
+        self._set_power(bs, 1)
+
+    def has_free_channels(self, bs):
+        return self.bs_load[bs] < u.MAX_BS_CAPACITY
+
+
+def move(coordinates, velocity, size):
+    """moves every mobile station one tick, bouncing its velocity off the map edges"""
+    next_coordinates = coordinates + velocity
+    bounce = (next_coordinates <= 0) | (next_coordinates >= size)
+    np.negative(velocity, out=velocity, where=bounce)
+    return next_coordinates
@@ -1,242 +1,171 @@
-import random
+import time
 
 import pygame
 import self_organizing_network.utils as u
 from self_organizing_network.base_station import BaseStation
 from self_organizing_network.mobile_station import MobileStation
+from self_organizing_network.simulation_engine import SimulationEngine
 
 
 class SimulationWindow:
-    def __init__(self, finish_listener=None, tick_listener=None, headless=False):
-        self._finish_listener = finish_listener
-        self._tick_listener = tick_listener
-
-        if headless:
-            self._display_size = (1, 1)
-        else:
-            self._display_size = (u.WINDOW_SIZE, u.WINDOW_SIZE)
-
-        self.time_elapsed = 0
-        self.score = 0
-        self.times_disconnected = 0
+    def __init__(self, finish_listener=None, tick_listener=None, simulation=None):
+        if simulation is None:
+            simulation = SimulationEngine(finish_listener=finish_listener,
+                                          tick_listener=tick_listener)
+        self.simulation = simulation
+
+        self._display_size = (u.WINDOW_SIZE, u.WINDOW_SIZE)
+
         self.speed = u.DEFAULT_SPEED
         self.display_connections = False
         self.running = False
 
         self._screen = None
         self._clock = None
+        self._scheduler = TickScheduler()
+        self._font = None
+        self._background = None
+        self._range_layer = None
+        self._drawn_rects = []
+        self._labels = {}
         self._base_stations = []
         self._mobile_stations = []
 
+    @property
+    def score(self):
+        return self.simulation.score
+
+    @property
+    def time_elapsed(self):
+        return self.simulation.time_elapsed
+
     def _init(self):
         pygame.init()
         self._screen = pygame.display.set_mode(self._display_size, pygame.HWSURFACE | pygame.DOUBLEBUF)
         self._clock = pygame.time.Clock()
+        self._font = pygame.font.SysFont("Consolas", 20)
         self.running = True
-        self._add_base_stations(u.DEFAULT_ROWS, u.DEFAULT_COLS)
-        self._add_mobile_stations(u.DEFAULT_MS)
-
-    def _restart(self):
-        self.time_elapsed = 0
-        self.score = 0
-        self.times_disconnected = 0
-        self._clock = pygame.time.Clock()
-        self.running = True
-        self._add_base_stations(u.DEFAULT_ROWS, u.DEFAULT_COLS)
-        self._add_mobile_stations(u.DEFAULT_MS)
-
-    def _add_base_stations(self, rows, cols):
-        self._base_stations = []
-        self._create_base_stations(rows, cols)
-        self._assign_neighbours(rows, cols)
-
-    def _create_base_stations(self, rows, cols):
-        power_variance = u.DEFAULT_BASE_STATION_POWER / 10
-        x_offset = u.WINDOW_SIZE / cols
-        y_offset = u.WINDOW_SIZE / rows
-
-        for y in range(rows):
-            if y % 2 == 0:
-                for x in range(cols):
-                    self._base_stations.append(BaseStation((x_offset / 2 + x * x_offset,
-                                                            y_offset / 2 + y * y_offset),
-                                                           u.DEFAULT_BASE_STATION_POWER
-                                                           + random.randrange(-power_variance, power_variance)))
-            else:
-                for x in range(cols + 1):
-                    self._base_stations.append(BaseStation((x * x_offset,
-                                                            y_offset / 2 + y * y_offset),
-                                                           u.DEFAULT_BASE_STATION_POWER
-                                                           + random.randrange(-power_variance, power_variance)))
-
-        # self._base_stations[random.randrange(0, len(self._base_stations))].turn_off()
-
-    def _assign_neighbours(self, rows, cols):
-        for y in range(rows):
-            if y % 2 == 0:
-                for x in range(cols):
-                    bs = self._get_base_station(x, y, rows, cols)
-                    bs.add_neighbour(self._get_base_station(x, y - 1, rows, cols))
-                    bs.add_neighbour(self._get_base_station(x + 1, y - 1, rows, cols))
-                    bs.add_neighbour(self._get_base_station(x - 1, y, rows, cols))
-                    bs.add_neighbour(self._get_base_station(x + 1, y, rows, cols))
-                    bs.add_neighbour(self._get_base_station(x, y + 1, rows, cols))
-                    bs.add_neighbour(self._get_base_station(x + 1, y + 1, rows, cols))
-            else:
-                for x in range(cols + 1):
-                    bs = self._get_base_station(x, y, rows, cols)
-                    bs.add_neighbour(self._get_base_station(x - 1, y - 1, rows, cols))
-                    bs.add_neighbour(self._get_base_station(x, y - 1, rows, cols))
-                    bs.add_neighbour(self._get_base_station(x - 1, y, rows, cols))
-                    bs.add_neighbour(self._get_base_station(x + 1, y, rows, cols))
-                    bs.add_neighbour(self._get_base_station(x - 1, y + 1, rows, cols))
-                    bs.add_neighbour(self._get_base_station(x, y + 1, rows, cols))
-
-    def _get_base_station(self, x, y, rows, cols_per_even_row):
-        if y % 2 == 0:
-            if not (0 <= y < cols_per_even_row and 0 <= x < rows):
-                return None
-            even_rows = int(y / 2)
-            odd_rows = int(y / 2)
-        else:
-            if not (0 <= y < cols_per_even_row and 0 <= x <= rows):
-                return None
-            even_rows = int(y / 2) + 1
-            odd_rows = int(y / 2)
-
-        index = (even_rows * cols_per_even_row) + (odd_rows * (cols_per_even_row + 1)) + x
-        return self._base_stations[index]
-
-
-    def _add_mobile_stations(self, num):
-        self._mobile_stations = []
-        for _ in range(num):
-            self._mobile_stations.append(MobileStation(u.CENTER_POINT))
+        self.simulation.reset()
+        self._base_stations = [BaseStation(self.simulation, i) for i in range(len(self.simulation.bs_power))]
+        self._mobile_stations = [MobileStation(self.simulation, i) for i in range(self.simulation.ms_count)]
+
+        self._background = pygame.Surface(self._display_size)
+        self._background.fill(u.COLOR_LIGHT_GREY)
+        self._range_layer = self._background.copy()
+        self._screen.blit(self._background, (0, 0))
+        pygame.display.update()
 
     def run(self):
         self._init()
 
-        while self.running:
-            self._clock.tick(60 * self.speed)
-
-            for event in pygame.event.get():
-                self._handle_event(event)
+        try:
+            while self.running:
+                elapsed = self._clock.tick(u.RENDER_FPS)
 
-            self._refresh_time()
-            self._refresh_score()
-            self._refresh_connections()
-            self._render()
-            self._tick()
+                for event in pygame.event.get():
+                    self._handle_event(event)
 
-            if self.time_elapsed == u.DEFAULT_DURATION or self.times_disconnected > u.DISCONNECTED_TOLERANCE:
-                self._finish()
-                self._restart()
+                for _ in range(self._scheduler.ticks_for_frame(elapsed, self.speed)):
+                    self.simulation.step()
 
-        pygame.quit()
+                profiler = self.simulation.profiler
+                if profiler is None:
+                    self._render()
+                else:
+                    start = time.perf_counter()
+                    self._render()
+                    profiler.record('render', time.perf_counter() - start)
+        finally:
+            self.simulation.close()
+            pygame.quit()
 
     def _handle_event(self, event):
         if event.type == pygame.QUIT:
             self.running = False
 
-    def _refresh_time(self):
-        self.time_elapsed += 1
-
-    def _consider_fps(self, value):
-        fps = self._clock.get_fps()
-        if fps != 0:
-            result = value * (60 / fps)
-        else:
-            result = value
-        return result
-
-    def _refresh_score(self):
-        for ms in self._mobile_stations:
-            powers_sum = 0
-            for bs in self._base_stations:
-                powers_sum += bs.get_power()
-                if bs.get_power() == u.MAX_BASE_STATION_POWER or bs.get_power() == 1:
-                    self._finish()
-                    self._restart()
-            modifier = powers_sum/len(self._base_stations)
-
-            if ms.is_connected():
-                self.score += 1/modifier
-            else:
-                self.score -= 1/modifier
-
-
-    def _refresh_connections(self):
-        for ms in self._mobile_stations:
-            bs, power = self._find_best_base_station(ms)
-
-            if bs is not ms.base_station:
-                if ms.is_connected():
-                    ms.base_station.disconnect(ms)
-                    ms.disconnect()
-                if bs is not None:
-                    if bs.has_free_channels():
-                        bs.connect(ms)
-                        ms.connect(bs)
-                else:
-                    self.times_disconnected += 1
-
-            ms.power = power
-
-    def _find_best_base_station(self, mobile_station):
-        powers = []
+    def _render(self):
+        changed = self._refresh_range_layer()
+        for rect in self._drawn_rects + changed:
+            self._screen.blit(self._range_layer, rect, rect)
+
+        drawn = []
+        self._display_mobile_stations(drawn)
+        self._display_base_stations(drawn)
+        self._display_time(drawn)
+        self._display_fps(drawn)
+        self._display_tps(drawn)
+
+        pygame.display.update(self._drawn_rects + changed + drawn)
+        self._drawn_rects = drawn
+
+    def _refresh_range_layer(self):
+        """redraws the coverage circles, but only where a base station's range has changed"""
+        changed = []
         for bs in self._base_stations:
-            bs_power_density_in_ms_location = bs.calculate_power_density(mobile_station.coordinates)
-            powers.append(bs_power_density_in_ms_location)
-
-        max_power_density = max(powers)
-
-        if max_power_density > u.POWER_DENSITY_THRESHOLD:
-            max_index = powers.index(max_power_density)
-            return self._base_stations[max_index], max_power_density
-        else:
-            return None, None
+            changed += bs.refresh_range()
 
-    def _render(self):
-        self._screen.fill(u.COLOR_LIGHT_GREY)
-        self._display_mobile_stations()
-        self._display_base_stations()
-        self._display_time()
-        self._display_fps()
-        pygame.display.update()
+        for rect in changed:
+            self._range_layer.set_clip(rect)
+            self._range_layer.blit(self._background, rect, rect)
+            for bs in self._base_stations:
+                bs.draw_range(self._range_layer)
+        self._range_layer.set_clip(None)
+        return changed
 
-    def _display_mobile_stations(self):
+    def _display_mobile_stations(self, drawn):
         for ms in self._mobile_stations:
-            self._display_connection(ms)
-            ms.update(self._screen)
+            self._display_connection(ms, drawn)
+            drawn.append(ms.update(self._screen))
 
-    def _display_connection(self, mobile_station):
+    def _display_connection(self, mobile_station, drawn):
         if self.display_connections and mobile_station.is_connected():
-            pygame.draw.line(self._screen,
-                             u.COLOR_GREEN,
-                             mobile_station.coordinates,
-                             mobile_station.base_station.coordinates)
+            drawn.append(pygame.draw.line(self._screen,
+                                          u.COLOR_GREEN,
+                                          tuple(mobile_station.coordinates),
+                                          tuple(self.simulation.bs_coordinates[mobile_station.base_station])))
 
-    def _display_base_stations(self):
+    def _display_base_stations(self, drawn):
         for bs in self._base_stations:
-            bs.update(self._screen)
-
-    def _display_time(self):
-        font = pygame.font.SysFont("Consolas", 20)
-        label = font.render("Time: " + str(self.time_elapsed), 1, u.COLOR_BLACK)
-        self._screen.blit(label, (10, 10))
-
-    def _display_fps(self):
-        font = pygame.font.SysFont("Consolas", 20)
-        label = font.render("FPS: " + str(int(self._clock.get_fps())), 1, u.COLOR_BLACK)
-        self._screen.blit(label, (10, 30))
-
-    def _tick(self):
-        if self._tick_listener is not None:
-            # for bs in self._base_stations:
-            bs = self._base_stations[random.randrange(0, len(self._base_stations))]
-            power_change = self._tick_listener.on_tick(bs, self._mobile_stations)
-            bs.change_power_by(power_change)
-
-    def _finish(self):
-        if self._finish_listener is not None:
-            self._finish_listener.on_finish()
+            drawn.append(bs.update(self._screen))
+
+    def _display_time(self, drawn):
+        drawn.append(self._display_label("Time: " + str(self.time_elapsed), (10, 10)))
+
+    def _display_fps(self, drawn):
+        drawn.append(self._display_label("FPS: " + str(int(self._clock.get_fps())), (10, 30)))
+
+    def _display_tps(self, drawn):
+        drawn.append(self._display_label("TPS: " + str(int(self._scheduler.ticks_per_second)), (10, 50)))
+
+    def _display_label(self, text, position):
+        cached_text, label = self._labels.get(position, (None, None))
+        if cached_text != text:
+            label = self._font.render(text, 1, u.COLOR_BLACK)
+            self._labels[position] = (text, label)
+        return self._screen.blit(label, position)
+
+
+class TickScheduler:
+    """spreads TICKS_PER_SECOND * speed simulation ticks over frames rendered at a capped rate"""
+
+    def __init__(self):
+        self.ticks_per_second = 0
+        self._pending = 0.0
+        self._ticks = 0
+        self._measured_ms = 0
+
+    def ticks_for_frame(self, elapsed_ms, speed):
+        self._pending += elapsed_ms / 1000 * u.TICKS_PER_SECOND * speed
+        ticks = min(int(self._pending), u.MAX_TICKS_PER_FRAME)
+        # a backlog the simulation cannot catch up with is dropped instead of carried over
+        self._pending = min(self._pending - ticks, 1.0)
+        self._measure(elapsed_ms, ticks)
+        return ticks
+
+    def _measure(self, elapsed_ms, ticks):
+        self._ticks += ticks
+        self._measured_ms += elapsed_ms
+        if self._measured_ms >= 1000:
+            self.ticks_per_second = self._ticks * 1000 / self._measured_ms
+            self._ticks = 0
+            self._measured_ms = 0
@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+import self_organizing_network.utils as u
+
+
+def coverage_radius(power):
+    """distance at which the power density of a station drops to the connection threshold"""
+    return np.sqrt(np.asarray(power) / (4 * math.pi * u.POWER_DENSITY_THRESHOLD))
+
+
+class SpatialIndex:
+    """uniform grid of square cells, each listing the base stations whose coverage overlaps it"""
+
+    def __init__(self, coordinates, power, size):
+        self.cell_size = float(coverage_radius(u.MAX_BASE_STATION_POWER))
+        self.cells_per_side = max(1, int(math.ceil(size / self.cell_size)))
+
+        self._coordinates = coordinates
+        self._members = [set() for _ in range(self.cells_per_side ** 2)]
+        self._extents = np.zeros((len(power), 4), dtype=np.int64)
+        self._dirty = set()
+        self._table = np.full((len(self._members), 1), u.NO_BASE_STATION, dtype=np.int64)
+
+        extents = self._calculate_extents(np.arange(len(power)), power)
+        for bs, extent in enumerate(extents.tolist()):
+            self._extents[bs] = extent
+            for cell in self._cells_in(extent):
+                self._members[cell].add(bs)
+                self._dirty.add(cell)
+
+    def update(self, base_stations, power):
+        base_stations = np.atleast_1d(base_stations)
+        extents = self._calculate_extents(base_stations, power[base_stations])
+        moved = np.flatnonzero(np.any(extents != self._extents[base_stations], axis=1))
+
+        for bs, extent in zip(base_stations[moved].tolist(), extents[moved].tolist()):
+            old_cells = set(self._cells_in(self._extents[bs].tolist()))
+            new_cells = set(self._cells_in(extent))
+            for cell in old_cells - new_cells:
+                self._members[cell].discard(bs)
+            for cell in new_cells - old_cells:
+                self._members[cell].add(bs)
+            self._dirty |= old_cells ^ new_cells
+            self._extents[bs] = extent
+
+    def candidates(self, coordinates):
+        if self._dirty:
+            self._rebuild_table()
+        cells = self._cell_coordinates(coordinates)
+        return self._table[cells[:, 1] * self.cells_per_side + cells[:, 0]]
+
+    def _rebuild_table(self):
+        width = max(len(self._members[cell]) for cell in self._dirty)
+        if width > self._table.shape[1]:
+            grown = np.full((len(self._members), width), u.NO_BASE_STATION, dtype=np.int64)
+            grown[:, :self._table.shape[1]] = self._table
+            self._table = grown
+
+        for cell in self._dirty:
+            members = sorted(self._members[cell])
+            self._table[cell, :len(members)] = members
+            self._table[cell, len(members):] = u.NO_BASE_STATION
+        self._dirty = set()
+
+    def _calculate_extents(self, base_stations, power):
+        # widened slightly so that rounding in sqrt can never drop a station that is just in range
+        radius = coverage_radius(power)[:, np.newaxis] * (1 + 1e-9)
+        centre = self._coordinates[base_stations]
+        low = self._cell_coordinates(centre - radius)
+        high = self._cell_coordinates(centre + radius)
+        return np.hstack((low, high))
+
+    def _cell_coordinates(self, coordinates):
+        cells = np.floor(coordinates / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self.cells_per_side - 1)
+
+    def _cells_in(self, extent):
+        x_low, y_low, x_high, y_high = extent
+        return [y * self.cells_per_side + x
+                for y in range(y_low, y_high + 1)
+                for x in range(x_low, x_high + 1)]
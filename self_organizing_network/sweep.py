@@ -0,0 +1,228 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+
+import self_organizing_network.utils as u
+
+
+# the six fields of the parameter dialog, as options of the trainer
+PARAMETERS = ['population', 'children', 'crossover', 'mutation', 'hidden_layers', 'weight_variance']
+
+
+def grid(space):
+    """every combination of the listed values"""
+    return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+
+def sample(space, count, generator):
+    """count configurations, a value being drawn from a list, or from
+    {"int": [low, high]}, {"uniform": [low, high]} or {"log_uniform": [low, high]}"""
+    return [{name: _draw(values, generator) for name, values in space.items()} for _ in range(count)]
+
+
+def _draw(values, generator):
+    if isinstance(values, list):
+        return generator.choice(values)
+    (kind, (low, high)), = values.items()
+    if kind == 'int':
+        return generator.randint(low, high)
+    if kind == 'uniform':
+        return generator.uniform(low, high)
+    if kind == 'log_uniform':
+        return math.exp(generator.uniform(math.log(low), math.log(high)))
+    raise ValueError('unknown distribution ' + kind)
+
+
+def configurations(spec):
+    """configurations of a spec: {"grid": {...}} or {"random": {...}, "samples": n}, parameters
+    missing from them keep their defaults"""
+    defaults = dict(zip(PARAMETERS, u.DEFAULT_EA_PARAMETERS))
+    if 'grid' in spec:
+        found = grid(spec['grid'])
+    else:
+        found = sample(spec['random'], spec['samples'], random.Random(spec.get('seed')))
+    unknown = set(name for configuration in found for name in configuration) - set(PARAMETERS)
+    if unknown:
+        raise ValueError('unknown parameters ' + ', '.join(sorted(unknown)))
+    return [dict(defaults, **configuration) for configuration in found]
+
+
+def rungs(min_generations, max_generations, eta):
+    """generation budgets at which the worse configurations are stopped"""
+    budgets = [min_generations]
+    while budgets[-1] < max_generations:
+        budgets.append(min(budgets[-1] * eta, max_generations))
+    return budgets
+
+
+def score(curve, window=u.SWEEP_SCORE_WINDOW):
+    """mean generation score over the last window generations, steadier than the best single episode"""
+    recent = curve[-window:]
+    return sum(record['mean'] for record in recent) / len(recent)
+
+
+class ResultsTable:
+    """one row per configuration and rung in an SQLite database"""
+
+    COLUMNS = ['sweep', 'trial', 'rung', 'generations'] + PARAMETERS + ['score', 'best', 'mean', 'seconds', 'status']
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS results (sweep TEXT, trial INTEGER, rung INTEGER, '
+                                'generations INTEGER, population INTEGER, children INTEGER, crossover REAL, '
+                                'mutation REAL, hidden_layers INTEGER, weight_variance REAL, score REAL, '
+                                'best REAL, mean REAL, seconds REAL, status TEXT)')
+        self.connection.commit()
+
+    def record(self, **row):
+        self.connection.execute('INSERT INTO results VALUES (%s)' % ', '.join('?' * len(self.COLUMNS)),
+                                [row.get(column) for column in self.COLUMNS])
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class Trial:
+    def __init__(self, number, configuration, directory):
+        self.number = number
+        self.configuration = configuration
+        self.directory = directory
+        self.curve_path = os.path.join(directory, 'curve.jsonl')
+        self.process = None
+        self.started = None
+        self.seconds = 0
+        self.failed = False
+
+    def curve(self):
+        if not os.path.exists(self.curve_path):
+            return []
+        with open(self.curve_path) as file:
+            return [json.loads(line) for line in file]
+
+
+class Sweep:
+    """trains configurations concurrently within a CPU budget, each for a growing number of generations;
+    after every rung only the best 1/eta of them go on (successive halving)"""
+
+    def __init__(self, configurations, directory, table, cpus=u.EVALUATION_WORKERS, workers=1,
+                 min_generations=u.SWEEP_MIN_GENERATIONS, max_generations=u.SWEEP_MAX_GENERATIONS, eta=u.SWEEP_ETA,
+                 seed=0, train_arguments=()):
+        self.name = os.path.basename(os.path.normpath(directory))
+        self.trials = [Trial(number, configuration, os.path.join(directory, 'trial_%04d' % number))
+                       for number, configuration in enumerate(configurations)]
+        self.table = table
+        self.workers = workers  # evaluation processes of every training run
+        self.concurrency = max(cpus // workers, 1)
+        self.rungs = rungs(min_generations, max_generations, eta)
+        self.eta = eta
+        self.seed = seed  # shared, so that configurations are compared on the same episodes
+        self.train_arguments = list(train_arguments)
+        # a swept parameter passed on to the runs would override every configuration behind the table's back
+        # (the trainer also takes abbreviations, such as --mut for --mutation)
+        swept = ['--' + name.replace('_', '-') for name in PARAMETERS]
+        options = [argument.split('=')[0] for argument in self.train_arguments if argument.startswith('--')]
+        overridden = sorted(set(option for option in options
+                                if len(option) > 2 and any(name.startswith(option) for name in swept)))
+        if overridden:
+            raise ValueError('swept parameters cannot be passed on to the runs: ' + ', '.join(overridden))
+
+    def run(self):
+        trials = self.trials
+        for rung, generations in enumerate(self.rungs):
+            self._train(trials, generations, resume=rung > 0)
+            ranked = sorted([trial for trial in trials if not trial.failed],
+                            key=lambda trial: score(trial.curve()), reverse=True)
+            last = rung == len(self.rungs) - 1
+            kept = ranked if last else ranked[:max(math.ceil(len(ranked) / self.eta), 1)]
+            for trial in trials:
+                self._record(trial, rung, generations, 'failed' if trial.failed else
+                             'finished' if last else 'promoted' if trial in kept else 'stopped')
+            trials = kept
+        return trials
+
+    def _train(self, trials, generations, resume):
+        waiting = list(trials)
+        running = []
+        while waiting or running:
+            while waiting and len(running) < self.concurrency:
+                trial = waiting.pop(0)
+                trial.process = subprocess.Popen(self._command(trial, generations, resume),
+                                                 stdout=subprocess.DEVNULL)
+                trial.started = time.perf_counter()
+                running.append(trial)
+            time.sleep(0.2)
+            for trial in [trial for trial in running if trial.process.poll() is not None]:
+                running.remove(trial)
+                trial.seconds += time.perf_counter() - trial.started
+                trial.failed = trial.process.returncode != 0 or not trial.curve()
+
+    def _command(self, trial, generations, resume):
+        configuration = trial.configuration
+        command = [sys.executable, '-m', 'self_organizing_network.train', '--quiet',
+                   '--generations', str(generations),
+                   '--workers', str(self.workers),
+                   '--seed', str(self.seed),
+                   '--jsonl', trial.curve_path,
+                   '--checkpoint-dir', trial.directory,
+                   '--checkpoint-generations', '0',
+                   '--checkpoint-minutes', '0']
+        if resume:
+            command += ['--resume', trial.directory]
+        else:
+            os.makedirs(trial.directory, exist_ok=True)
+            for name in PARAMETERS:
+                command += ['--' + name.replace('_', '-'), str(configuration[name])]
+        return command + self.train_arguments
+
+    def _record(self, trial, rung, generations, status):
+        curve = trial.curve()
+        self.table.record(sweep=self.name, trial=trial.number, rung=rung, generations=generations,
+                          score=score(curve) if curve else None,
+                          best=curve[-1]['best_overall'] if curve else None,
+                          mean=curve[-1]['mean'] if curve else None,
+                          seconds=trial.seconds, status=status, **trial.configuration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search EA parameters with concurrent training runs, stopping '
+                                                 'the worse configurations early.',
+                                     epilog='unknown options are passed on to every training run')
+    parser.add_argument('spec', help='JSON file: {"grid": {"population": [10, 20], ...}} or '
+                                     '{"random": {"mutation": {"uniform": [0, 1]}, ...}, "samples": 20}')
+    parser.add_argument('--directory', help='where the runs are kept, sweeps/<spec name> by default')
+    parser.add_argument('--database', default=os.path.join(u.SWEEP_DIR, 'results.sqlite'))
+    parser.add_argument('--cpus', type=int, default=u.EVALUATION_WORKERS, help='processes for all runs together')
+    parser.add_argument('--workers', type=int, default=1, help='evaluation processes of every run')
+    parser.add_argument('--min-generations', type=int, default=u.SWEEP_MIN_GENERATIONS)
+    parser.add_argument('--max-generations', type=int, default=u.SWEEP_MAX_GENERATIONS)
+    parser.add_argument('--eta', type=int, default=u.SWEEP_ETA, help='1/eta of the configurations survive a rung')
+    parser.add_argument('--seed', type=int, default=0)
+    args, train_arguments = parser.parse_known_args()
+
+    with open(args.spec) as file:
+        spec = json.load(file)
+    directory = args.directory or os.path.join(u.SWEEP_DIR, os.path.splitext(os.path.basename(args.spec))[0])
+    if os.path.exists(directory):
+        # old curves and checkpoints would be mistaken for the new runs'
+        parser.error(directory + ' already exists, choose another --directory')
+    os.makedirs(os.path.dirname(os.path.abspath(args.database)), exist_ok=True)
+    table = ResultsTable(args.database)
+    try:
+        sweep = Sweep(configurations(spec), directory, table, args.cpus, args.workers, args.min_generations,
+                      args.max_generations, args.eta, args.seed, train_arguments)
+        for trial in sweep.run():
+            print('trial %4d  score %10.3f  %s' % (trial.number, score(trial.curve()), json.dumps(trial.configuration)))
+    finally:
+        table.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import numpy as np
+import self_organizing_network.utils as u
+
+
+NEIGHBOURS = 6
+
+# (dx, dy) of the neighbours of a station in an even row (cols stations, shifted half a column
+# to the right) and in an odd row (cols + 1 stations), in the order the network inputs expect
+EVEN_ROW_OFFSETS = [(0, -1), (1, -1), (-1, 0), (1, 0), (0, 1), (1, 1)]
+ODD_ROW_OFFSETS = [(-1, -1), (0, -1), (-1, 0), (1, 0), (-1, 1), (0, 1)]
+
+
+def station_count(rows, cols):
+    return index(0, rows, cols)
+
+
+def index(x, y, cols):
+    even_rows = (y + 1) // 2
+    odd_rows = y // 2
+    return even_rows * cols + odd_rows * (cols + 1) + x
+
+
+def grid_positions(rows, cols):
+    """column and row of every station, in index order"""
+    x = []
+    y = []
+    for row in range(rows):
+        row_length = cols if row % 2 == 0 else cols + 1
+        x.append(np.arange(row_length))
+        y.append(np.full(row_length, row))
+    if not x:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(x), np.concatenate(y)
+
+
+def hex_coordinates(rows, cols, size):
+    x, y = grid_positions(rows, cols)
+    x_offset = size / cols
+    y_offset = size / rows
+
+    coordinates = np.empty((len(x), 2), dtype=np.float64)
+    coordinates[:, 0] = np.where(y % 2 == 0, x_offset / 2 + x * x_offset, x * x_offset)
+    coordinates[:, 1] = y_offset / 2 + y * y_offset
+    return coordinates
+
+
+def hex_neighbours(rows, cols):
+    """(stations, NEIGHBOURS) table of neighbour indices, NO_BASE_STATION where the grid ends"""
+    x, y = grid_positions(rows, cols)
+    even = (y % 2 == 0)[:, np.newaxis]
+    offsets = np.where(even[:, :, np.newaxis], np.array(EVEN_ROW_OFFSETS), np.array(ODD_ROW_OFFSETS))
+
+    neighbour_x = x[:, np.newaxis] + offsets[:, :, 0]
+    neighbour_y = y[:, np.newaxis] + offsets[:, :, 1]
+    row_length = np.where(neighbour_y % 2 == 0, cols, cols + 1)
+    valid = (0 <= neighbour_y) & (neighbour_y < rows) & (0 <= neighbour_x) & (neighbour_x < row_length)
+
+    return np.where(valid, index(neighbour_x, neighbour_y, cols), u.NO_BASE_STATION)
@@ -0,0 +1,246 @@
+import argparse
+import json
+import random
+import secrets
+import signal
+import sys
+import time
+
+import numpy as np
+import self_organizing_network.checkpoint as checkpoint
+import self_organizing_network.distributed as distributed
+import self_organizing_network.training_curve as training_curve
+import self_organizing_network.utils as u
+from self_organizing_network.ea_controller import EAController, BACKENDS
+from self_organizing_network.evaluation import BatchedEvaluator, GenerationRunner, ParallelEvaluator
+from self_organizing_network.fitness_cache import FitnessCache
+from self_organizing_network.islands import TOPOLOGIES, IslandModel
+
+
+class Trainer:
+    """generation listener of a headless run: reports every generation, keeps the statistics EAWindow
+    plots and stops the run after the last generation or when asked to"""
+
+    def __init__(self, ea_controller, last_generation, checkpointer=None, jsonl=None, stream=sys.stdout):
+        self.ea_controller = ea_controller
+        self.last_generation = last_generation
+        self.checkpointer = checkpointer
+        self.stream = stream
+        self.runner = None
+        self.generation = None  # the last one reported
+        self.stopping = False
+        self.best_score_overall = 0
+        self.best_curve = training_curve.CurveStore()
+        self.mean_curve = training_curve.CurveStore()
+        self._jsonl = open(jsonl, 'a') if jsonl is not None else None
+        self._started = time.perf_counter()
+        self._generation_started = self._started
+
+    def on_generation(self, generation, scores, truncated=None):
+        now = time.perf_counter()
+        self.generation = generation
+        if truncated is None:
+            truncated = self.ea_controller.truncated
+        # as in EAWindow, episodes cut short by racing are left out of the statistics
+        completed = [score for score, cut_short in zip(scores, truncated) if not cut_short]
+        best = max(completed, default=0)
+        mean = sum(completed) / max(len(completed), 1)
+        self.best_score_overall = max(self.best_score_overall, best)
+        self.best_curve.append(generation, best)
+        self.mean_curve.append(generation, mean)
+
+        record = {'generation': generation,
+                  'best': best,
+                  'mean': mean,
+                  'best_overall': self.best_score_overall,
+                  'truncated': len(scores) - len(completed),
+                  'seconds': now - self._generation_started,
+                  'elapsed': now - self._started}
+        self._generation_started = now
+        if self.stream is not None:
+            print('generation %6d  best %10.3f  mean %10.3f  best overall %10.3f  %7.2f s'
+                  % (generation, best, mean, self.best_score_overall, record['seconds']), file=self.stream, flush=True)
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps(record) + '\n')
+            self._jsonl.flush()
+
+        if self.stopping or generation >= self.last_generation:
+            # the generation is scored but not bred yet, the state a checkpoint has to capture
+            if self.checkpointer is not None:
+                self.checkpointer.write_now(self.ea_controller)
+            self.runner.running = False
+
+    def stop(self, *_):
+        """finishes the generation in progress, then checkpoints and stops"""
+        self.stopping = True
+
+    def statistics(self):
+        # the layout of EAWindow's, so that a headless run can be continued in the window
+        return {'best_score_overall': self.best_score_overall,
+                'best_curve': self.best_curve.state(),
+                'mean_curve': self.mean_curve.state(),
+                'training_log': None}
+
+    def restore(self, statistics):
+        if statistics is None:
+            return
+        self.best_score_overall = statistics['best_score_overall']
+        self.best_curve = training_curve.CurveStore.from_state(statistics['best_curve'])
+        self.mean_curve = training_curve.CurveStore.from_state(statistics['mean_curve'])
+
+    def close(self):
+        if self._jsonl is not None:
+            self._jsonl.close()
+
+
+def make_evaluator(workers, batched=u.BATCHED_EVALUATION, samples=u.EVALUATION_SAMPLES,
+                   common_random_numbers=u.COMMON_RANDOM_NUMBERS):
+    if batched:
+        return BatchedEvaluator(samples, common_random_numbers, workers)
+    return ParallelEvaluator(workers)
+
+
+def parse_arguments(arguments=None):
+    defaults = u.DEFAULT_EA_PARAMETERS
+    parser = argparse.ArgumentParser(description='Train the base station controller without a window.')
+    parser.add_argument('--population', type=int, default=defaults[0], help='population size')
+    parser.add_argument('--children', type=int, default=defaults[1], help='children bred per generation')
+    parser.add_argument('--crossover', type=float, default=defaults[2], help='crossover probability')
+    parser.add_argument('--mutation', type=float, default=defaults[3], help='mutation probability')
+    parser.add_argument('--hidden-layers', type=int, default=defaults[4])
+    parser.add_argument('--weight-variance', type=float, default=defaults[5])
+    parser.add_argument('--generations', type=int, required=True,
+                        help='number of the last generation to evaluate, also when resuming')
+    parser.add_argument('--workers', type=int, default=u.EVALUATION_WORKERS, help='evaluation processes')
+    parser.add_argument('--seed', type=int, help='makes episodes and the NumPy backend reproducible')
+    parser.add_argument('--backend', choices=BACKENDS, default=u.EA_BACKEND)
+    parser.add_argument('--batched', action='store_true', default=u.BATCHED_EVALUATION,
+                        help='evaluate episodes in lock-step batches')
+    parser.add_argument('--samples', type=int, default=u.EVALUATION_SAMPLES,
+                        help='episodes per network with --batched')
+    parser.add_argument('--common-random-numbers', action='store_true', default=u.COMMON_RANDOM_NUMBERS)
+    parser.add_argument('--racing', action='store_true', default=u.RACING,
+                        help='cut off episodes unlikely to beat the worst survivor (a heuristic: '
+                             'the power is assumed to stay as it is)')
+    parser.add_argument('--islands', type=int, default=u.ISLANDS,
+                        help='populations evolved in their own processes, migrating their best networks')
+    parser.add_argument('--migration-interval', type=int, default=u.MIGRATION_INTERVAL)
+    parser.add_argument('--migrants', type=int, default=u.MIGRANTS, help='networks every island sends')
+    parser.add_argument('--topology', choices=TOPOLOGIES, default=u.MIGRATION_TOPOLOGY)
+    parser.add_argument('--listen', help='host:port or Unix socket path on which to hand episodes out to '
+                                         'distributed workers instead of evaluating them locally')
+    parser.add_argument('--authkey', help='shared with the workers, by default $%s or else a random key that '
+                                          'is printed' % u.AUTHKEY_VARIABLE)
+    parser.add_argument('--batch-size', type=int, default=u.DISTRIBUTED_BATCH,
+                        help='networks per message to a worker, 0 for one per worker process')
+    parser.add_argument('--timeout', type=float, default=u.DISTRIBUTED_TIMEOUT,
+                        help='seconds after which a worker\'s networks are given to another one')
+    parser.add_argument('--fitness-cache', help='file keeping the scores of evaluated genomes between runs')
+    parser.add_argument('--checkpoint-dir', default=u.CHECKPOINT_DIR)
+    parser.add_argument('--checkpoint-generations', type=int, default=u.CHECKPOINT_GENERATIONS)
+    parser.add_argument('--checkpoint-minutes', type=float, default=u.CHECKPOINT_MINUTES)
+    parser.add_argument('--no-checkpoints', action='store_true')
+    parser.add_argument('--resume', help='checkpoint file, or a directory to resume from its newest checkpoint')
+    parser.add_argument('--jsonl', help='file every generation is appended to as a JSON line')
+    parser.add_argument('--record', metavar='DIR', help='record every episode, one directory per generation and '
+                                                        'network, to be watched with the replay tool')
+    parser.add_argument('--quiet', action='store_true', help='no progress lines on stdout')
+    args = parser.parse_args(arguments)
+    if args.islands > 1 and (args.resume is not None or args.listen is not None):
+        parser.error('--islands cannot be combined with --resume or --listen')
+    if args.record is not None and (args.batched or args.listen is not None or args.islands > 1):
+        parser.error('--record cannot be combined with --batched, --listen or --islands')
+    return args
+
+
+def train(args):
+    """runs the training described by parse_arguments' result; returns the last evaluated generation"""
+    if args.seed is not None:
+        random.seed(args.seed)
+        np.random.seed(args.seed % 2 ** 32)
+
+    if args.islands > 1:
+        return train_islands(args)
+
+    ea_controller = EAController(stats_window=None, backend=args.backend)
+    ea_controller.racing = args.racing
+    if args.fitness_cache is not None and ea_controller.fitness_cache is not None:
+        ea_controller.fitness_cache = FitnessCache(path=args.fitness_cache)
+
+    trainer = Trainer(ea_controller, args.generations, jsonl=args.jsonl, stream=None if args.quiet else sys.stdout)
+    checkpointer = None
+    if not args.no_checkpoints:
+        checkpointer = checkpoint.Checkpointer(args.checkpoint_dir, args.checkpoint_generations,
+                                               args.checkpoint_minutes, statistics=trainer.statistics)
+        trainer.checkpointer = checkpointer
+        ea_controller.checkpointer = checkpointer
+
+    if args.resume is not None:
+        _, statistics = checkpoint.resume(args.resume, ea_controller)
+        trainer.restore(statistics)
+    else:
+        ea_controller.initialize_ea([args.population, args.children, args.crossover, args.mutation,
+                                     args.hidden_layers, args.weight_variance], seed=args.seed)
+
+    if ea_controller.get_current_generation() > args.generations:
+        trainer.close()
+        return ea_controller.get_current_generation() - 1
+
+    if args.listen is not None:
+        key = distributed.authkey(args.authkey)
+        if key is None:
+            key = secrets.token_hex(16)
+            print('workers need --authkey %s' % key, file=sys.stderr, flush=True)
+        evaluator = distributed.DistributedEvaluator(distributed.parse_address(args.listen), key.encode(),
+                                                     args.batch_size, args.timeout,
+                                                     should_stop=lambda: trainer.stopping)
+        print('waiting for workers on %s' % (evaluator.address,), file=sys.stderr, flush=True)
+    else:
+        evaluator = make_evaluator(args.workers, args.batched, args.samples, args.common_random_numbers)
+    trainer.runner = GenerationRunner(ea_controller=ea_controller, generation_listener=trainer,
+                                      workers=args.workers, seed=args.seed, evaluator=evaluator,
+                                      record_directory=args.record)
+    try:
+        _run(trainer)
+    except distributed.Stopped as error:
+        print(error, file=sys.stderr)
+    finally:
+        if checkpointer is not None:
+            checkpointer.wait()
+        if args.listen is not None:
+            evaluator.close()
+    return trainer.generation
+
+
+def train_islands(args):
+    """the island model has no single population to checkpoint, each island's lives in its own process"""
+    if not args.no_checkpoints:
+        print('island runs are not checkpointed', file=sys.stderr)
+    trainer = Trainer(None, args.generations, jsonl=args.jsonl, stream=None if args.quiet else sys.stdout)
+    parameters = [args.population, args.children, args.crossover, args.mutation, args.hidden_layers,
+                  args.weight_variance]
+    trainer.runner = IslandModel(parameters, generation_listener=trainer, islands=args.islands,
+                                 migration_interval=args.migration_interval, migrants=args.migrants,
+                                 topology=args.topology, seed=args.seed, workers=max(args.workers // args.islands, 1),
+                                 racing=args.racing)
+    _run(trainer)
+    return trainer.generation
+
+
+def _run(trainer):
+    # batch queues ask a job to end with SIGTERM: the generation in progress is finished and checkpointed
+    previous_handlers = {number: signal.signal(number, trainer.stop) for number in [signal.SIGINT, signal.SIGTERM]}
+    try:
+        trainer.runner.run()
+    finally:
+        for number, handler in previous_handlers.items():
+            signal.signal(number, handler)
+        trainer.close()
+
+
+def main():
+    train(parse_arguments())
+
+
+if __name__ == '__main__':
+    main()
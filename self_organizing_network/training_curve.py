@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import self_organizing_network.utils as u
+
+
+LOG_DTYPE = np.dtype([('generation', '<i8'), ('best', '<f8'), ('mean', '<f8')])
+
+
+class CurveStore:
+    """bounded (x, y) history; once full, groups of points are reduced to their minimum and maximum"""
+
+    def __init__(self, capacity=u.PLOT_POINTS):
+        self.capacity = capacity - capacity % 4
+        self.count = 0
+        self._x = np.empty(self.capacity)
+        self._y = np.empty(self.capacity)
+        self._size = 0
+        self._bucket = 1  # raw points summarised by every stored (min, max) pair
+        self._pending = []
+
+    def append(self, x, y):
+        self.count += 1
+        if self._bucket == 1:
+            self._store(x, y)
+            return
+
+        self._pending.append((x, y))
+        if len(self._pending) == self._bucket:
+            pending = np.array(self._pending)
+            self._pending = []
+            for i in sorted([pending[:, 1].argmin(), pending[:, 1].argmax()]):
+                self._store(*pending[i])
+
+    def points(self):
+        """displayed x and y: the stored points followed by the ones still waiting for their bucket"""
+        x = self._x[:self._size]
+        y = self._y[:self._size]
+        if self._pending:
+            pending = np.array(self._pending)
+            x = np.concatenate((x, pending[:, 0]))
+            y = np.concatenate((y, pending[:, 1]))
+        return x.copy(), y.copy()
+
+    def state(self):
+        return {'capacity': self.capacity, 'count': self.count, 'bucket': self._bucket,
+                'x': self._x[:self._size].copy(), 'y': self._y[:self._size].copy(), 'pending': list(self._pending)}
+
+    @classmethod
+    def from_state(cls, state):
+        store = cls(state['capacity'])
+        store.count = state['count']
+        store._bucket = state['bucket']
+        store._size = len(state['x'])
+        store._x[:store._size] = state['x']
+        store._y[:store._size] = state['y']
+        store._pending = list(state['pending'])
+        return store
+
+    def _store(self, x, y):
+        if self._size == self.capacity:
+            self._compact()
+        self._x[self._size] = x
+        self._y[self._size] = y
+        self._size += 1
+
+    def _compact(self):
+        x = self._x.reshape(-1, 4)
+        y = self._y.reshape(-1, 4)
+        keep = np.sort(np.stack((y.argmin(axis=1), y.argmax(axis=1)), axis=1), axis=1)
+        rows = np.arange(len(keep))[:, np.newaxis]
+        half = self.capacity // 2
+        self._x[:half] = x[rows, keep].ravel()
+        self._y[:half] = y[rows, keep].ravel()
+        self._size = half
+        self._bucket = 4 if self._bucket == 1 else self._bucket * 2
+
+
+class TrainingLog:
+    """full per-generation history appended to a binary file of LOG_DTYPE records"""
+
+    def __init__(self, path, records=None):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'ab')
+        if records is not None:
+            # generations logged after a checkpoint are dropped when resuming from it
+            self._file.truncate(records * LOG_DTYPE.itemsize)
+
+    def append(self, generation, best, mean):
+        np.array([(generation, best, mean)], dtype=LOG_DTYPE).tofile(self._file)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def new_log_path(directory=u.TRAINING_LOG_DIR):
+    return os.path.join(directory, 'training_%d.log' % u.millis())
+
+
+def read_log(path):
+    return np.fromfile(path, dtype=LOG_DTYPE)
@@ -1,3 +1,5 @@
+import hashlib
+import os
 import time
 
 
@@ -5,6 +7,12 @@ def millis():
     return int(round(time.time() * 1000))
 
 
+def derive_seed(*parts):
+    """stable 64-bit seed for a named stream, identical across processes and runs"""
+    digest = hashlib.sha256(':'.join(str(part) for part in parts).encode()).digest()
+    return int.from_bytes(digest[:8], 'little')
+
+
 COLOR_WHITE = (255, 255, 255)
 COLOR_BLACK = (0, 0, 0)
 COLOR_LIGHT_GREY = (192, 192, 192)
@@ -13,6 +21,9 @@ COLOR_RED = (255, 0, 0)
 
 WINDOW_SIZE = 600
 DEFAULT_SPEED = 1
+TICKS_PER_SECOND = 60  # simulation ticks per second at speed 1
+RENDER_FPS = 60
+MAX_TICKS_PER_FRAME = 1000
 DEFAULT_DURATION = 5000
 CENTER_POINT = (WINDOW_SIZE/2, WINDOW_SIZE/2)
 
@@ -25,3 +36,41 @@ DEFAULT_COLS = 3
 DEFAULT_MS = 25
 MAX_BS_CAPACITY = DEFAULT_MS / 2
 DISCONNECTED_TOLERANCE = DEFAULT_MS / 2
+NO_BASE_STATION = -1
+
+ROTATION_ATLAS_SIZE = 720  # rotated sprite images kept in memory
+
+SPATIAL_INDEX_MIN_BASE_STATIONS = 64
+SYNCHRONOUS_CONTROL = False  # every base station acts on every tick
+EVALUATION_WORKERS = os.cpu_count() or 1
+PROFILER_WINDOW = 1000  # ticks kept by the tick profiler
+GUI_REFRESH_MS = 100  # how often the control window shows the latest simulation state
+PLOT_POINTS = 2000  # points per training curve kept for display
+TRAINING_LOG_DIR = 'logs'  # full per-generation training histories
+EA_BACKEND = 'auto'  # pyvolution, numpy, or pyvolution when it can be loaded
+CHECKPOINT_DIR = 'checkpoints'
+CHECKPOINT_GENERATIONS = 10  # checkpoint at least every that many generations, 0 to disable
+CHECKPOINT_MINUTES = 5  # and at least every that many minutes, 0 to disable
+CHECKPOINTS_KEPT = 3
+FITNESS_CACHE_SIZE = 1000  # genomes whose scores are remembered, 0 to disable
+FITNESS_SAMPLES = 1  # scored episodes after which a genome is no longer evaluated
+BATCHED_EVALUATION = False  # evaluate a generation's episodes in lock-step batches
+EVALUATION_SAMPLES = 1  # episodes per network when evaluating in batches
+COMMON_RANDOM_NUMBERS = False  # every network of a generation faces the same episodes
+RACING = False  # cut off episodes unlikely to beat the generation's worst survivor, a heuristic
+RACING_INTERVAL = 100  # ticks between racing checks
+# population, children per generation, crossover and mutation probability, hidden layers, weight variance
+DEFAULT_EA_PARAMETERS = [10, 4, 1, 0.5, 3, 10.0]
+AUTHKEY_VARIABLE = 'SON_AUTHKEY'  # environment variable holding the key shared by a coordinator and its workers
+DISTRIBUTED_BATCH = 0  # networks per message to a distributed worker, 0 for one per worker process
+DISTRIBUTED_TIMEOUT = 600  # seconds after which a worker's batch is given to another worker
+DISTRIBUTED_RETRY = 60  # seconds a distributed worker keeps trying to reach its coordinator
+ISLANDS = 1  # populations evolved side by side in their own processes, 1 for a single population
+MIGRATION_INTERVAL = 5  # generations between migrations
+MIGRANTS = 2  # best networks every island sends at a migration
+MIGRATION_TOPOLOGY = 'ring'  # ring: to the next island, random: to any other island
+SWEEP_DIR = 'sweeps'
+SWEEP_MIN_GENERATIONS = 5  # generations every configuration of a sweep is trained for
+SWEEP_MAX_GENERATIONS = 45  # generations of the configurations that survive every rung
+SWEEP_ETA = 3  # a third of the configurations go on to the next rung
+SWEEP_SCORE_WINDOW = 5  # last generations whose mean scores rank a configuration
@@ -0,0 +1,29 @@
+import numpy as np
+import self_organizing_network.numpy_evolution as numpy_evolution
+
+
+def _algorithm(seed):
+    parameters = numpy_evolution.EvolutionaryAlgorithmParameters()
+    parameters.population_size = 5
+    return numpy_evolution.EvolutionaryAlgorithm(parameters, seed)
+
+
+def test_population_pass_matches_feed_forward():
+    population = _algorithm(1).population
+    rng = np.random.default_rng(2)
+    indices = rng.integers(0, len(population), 40)
+    inputs = rng.normal(size=(40, 14))
+
+    outputs = population.feed_forward_population(indices, inputs)
+    expected = np.array([population.feed_forward(index, row) for index, row in zip(indices, inputs)])
+    np.testing.assert_allclose(outputs, expected, rtol=1e-12)
+
+
+def test_rows_of_several_populations():
+    networks = [_algorithm(seed).get_next() for seed in (1, 2)]
+    networks += [network.detached() for network in networks]
+    inputs = np.random.default_rng(3).normal(size=(len(networks), 14))
+
+    outputs = numpy_evolution.feed_forward_rows(networks, inputs)
+    expected = np.array([network.feed_forward_all(row[np.newaxis])[0] for network, row in zip(networks, inputs)])
+    np.testing.assert_allclose(outputs, expected, rtol=1e-12)